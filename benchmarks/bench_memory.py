@@ -0,0 +1,42 @@
+import gc
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import brainstormer_p2
+
+
+def build_model(count, seed=0):
+    rand = random.Random(seed)
+    authors = ["author" + str(i) for i in range(20)]
+    model = brainstormer_p2.Model(indexed=False)
+    model.new_model("root", author=authors[0])
+    posts = model.time_ordered
+    for i in range(1, count):
+        parent = posts[rand.randrange(i)]
+        destination = posts[rand.randrange(i)] if rand.random() < 0.1 else None
+        auxiliary = rand.choice([brainstormer_p2.Post.Neutral] * 8 +
+                                [brainstormer_p2.Post.Canon, brainstormer_p2.Post.Suppress])
+        model.add_post(parent, destination, "post number " + str(i), score=rand.randint(-3, 3),
+                       auxiliary=auxiliary, author=rand.choice(authors))
+    return model
+
+
+def measure(count):
+    gc.collect()
+    tracemalloc.start()
+    model = build_model(count)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return model, size
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    model, size = measure(count)
+    print("posts:", len(model.time_ordered))
+    print("bytes per post:", round(size / count, 1))
@@ -0,0 +1,157 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import brainstormer_p2
+from brainstormer_p2 import PageLayout, LayoutSettings
+from bugmodel import Model
+from generate import Shapes, generate
+
+LayoutRoots = 20
+
+
+def best_time(action, repeat):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        action()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def loaded(path):
+    model = Model()
+    model.read_from_file(path)
+    return model
+
+
+def layout_roots(model, seed):
+    rand = random.Random(seed)
+    count = len(model.time_ordered)
+    return [model.time_ordered[0]] + [model.time_ordered[rand.randrange(count)] for _ in range(LayoutRoots - 1)]
+
+
+def bench_shape(shape, count, seed, repeat, folder, app):
+    results = {}
+    text_path = os.path.join(folder, shape + ".bug")
+    binary_path = os.path.join(folder, shape + Model.binary_extension)
+    generated = generate(shape, count, seed)
+    generated.write_to_file(text_path)
+    generated.write_to_file(binary_path)
+    del generated
+
+    results["read_text"] = best_time(lambda: loaded(text_path), repeat)
+    results["read_binary"] = best_time(lambda: loaded(binary_path), repeat)
+
+    gc.collect()
+    tracemalloc.start()
+    model = loaded(text_path)
+    gc.collect()
+    results["model_bytes"] = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    results["store_bytes"] = model.store.nbytes()
+
+    scratch = os.path.join(folder, "scratch")
+    results["write_text"] = best_time(lambda: model.write_to_file(scratch + ".bug"), repeat)
+    results["write_binary"] = best_time(lambda: model.write_to_file(scratch + Model.binary_extension), repeat)
+
+    def formality():
+        model.store.resolve_formality()
+        model.store.refresh()
+    results["formality"] = best_time(formality, repeat)
+
+    queries = [shape, shape + " post 1", "post 12", "xxxx", "missing"]
+    results["search"] = best_time(lambda: [model.search(query, 50) for query in queries], repeat)
+
+    roots = layout_roots(model, seed)
+    settings = LayoutSettings(seed=seed)
+    results["layout"] = best_time(lambda: [PageLayout(root, settings).compute() for root in roots], repeat)
+
+    if app is not None:
+        view = brainstormer_p2.View(text_path)
+        while view.load_thread is not None:
+            app.processEvents()
+        main_doc = view.main_doc
+        view_roots = layout_roots(view.model, seed)
+
+        def load_pages():
+            for root in view_roots:
+                main_doc.page_cache.clear()
+                main_doc.loadPage(root)
+        results["load_page"] = best_time(load_pages, repeat)
+        view.has_unsaved = False
+        view.close()
+        view.deleteLater()
+        app.processEvents()
+
+    try:
+        import graphview
+    except ImportError:
+        graphview = None
+    if graphview is not None:
+        results["graph"] = best_time(lambda: graphview.build_graph(model), repeat)
+
+    results["peak_rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return results
+
+
+def commit_id():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+    for shape, stages in results["shapes"].items():
+        old_stages = baseline["shapes"].get(shape, {})
+        for stage, value in stages.items():
+            old = old_stages.get(stage)
+            if old:
+                print("%-8s %-13s %14.6g %14.6g %7.2fx" % (shape, stage, old, value, value / old))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time the brainstormer pipeline on synthetic graphs.")
+    parser.add_argument("--count", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--shapes", nargs="+", choices=Shapes, default=Shapes)
+    parser.add_argument("--no-gui", action="store_true", help="skip MainDoc.loadPage timings")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    app = None
+    if not args.no_gui:
+        from PyQt5.QtWidgets import QApplication
+        app = QApplication([])
+
+    results = {"commit": commit_id(), "python": platform.python_version(), "time": int(time.time()),
+               "count": args.count, "seed": args.seed, "repeat": args.repeat, "shapes": {}}
+    with tempfile.TemporaryDirectory() as folder:
+        for shape in args.shapes:
+            results["shapes"][shape] = bench_shape(shape, args.count, args.seed, args.repeat, folder, app)
+            print(shape, json.dumps(results["shapes"][shape]))
+
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=1)
+    if args.compare is not None:
+        compare(results, args.compare)
@@ -0,0 +1,70 @@
+import argparse
+import os
+import random
+import sys
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bugmodel import Model, Post
+
+BaseTime = 1600000000
+Shapes = ["chains", "hubs", "links", "formal", "authors", "mixed"]
+
+
+def pick_parent(shape, rand, posts, i):
+    if shape == "chains":
+        return posts[i - 1] if rand.random() < 0.97 else posts[rand.randrange(i)]
+    if shape == "hubs":
+        return posts[rand.randrange(min(i, 16))] if rand.random() < 0.8 else posts[rand.randrange(i)]
+    if shape == "mixed":
+        roll = rand.random()
+        if roll < 0.3:
+            return posts[i - 1]
+        if roll < 0.5:
+            return posts[rand.randrange(min(i, 16))]
+    return posts[rand.randrange(i)]
+
+
+def pick_destination(shape, rand, posts, i):
+    chance = {"links": 0.6, "mixed": 0.15}.get(shape, 0.05)
+    return posts[rand.randrange(i)] if rand.random() < chance else None
+
+
+def pick_auxiliary(shape, rand, parent):
+    if shape == "formal":
+        chance = 0.7 if parent.auxiliary != Post.Neutral else 0.3
+    else:
+        chance = 0.2 if shape == "mixed" else 0.05
+    if rand.random() >= chance:
+        return Post.Neutral
+    return Post.Canon if rand.random() < 0.5 else Post.Suppress
+
+
+def generate(shape, count, seed=0):
+    rand = random.Random(seed)
+    author_count = 5000 if shape == "authors" else 20
+    authors = ["author" + str(i) for i in range(author_count)]
+    model = Model(indexed=False)
+    model.new_model("root of " + shape, author=authors[0])
+    posts = model.time_ordered
+    for i in range(1, count):
+        parent = pick_parent(shape, rand, posts, i)
+        destination = pick_destination(shape, rand, posts, i)
+        auxiliary = pick_auxiliary(shape, rand, parent)
+        text = shape + " post " + str(i) + " " + "x" * rand.randrange(40)
+        model.add_post(parent, destination, text, score=rand.randint(-3, 3), auxiliary=auxiliary,
+                       author=rand.choice(authors))
+    start = BaseTime + rand.randrange(1000)
+    model.store.timestamp = array("q", range(start, start + count))
+    return model
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Write a seeded synthetic brainstormer graph.")
+    parser.add_argument("shape", choices=Shapes)
+    parser.add_argument("count", type=int)
+    parser.add_argument("path")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate(args.shape, args.count, args.seed).write_to_file(args.path)
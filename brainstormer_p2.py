@@ -2,39 +2,58 @@ import os
 import random
 import sys
 # import ctypes
-import bisect
+import heapq
 import time
+from collections import OrderedDict
 
 import numpy
 
+from bugmodel import Post, Model, ModelLoader
+from instrumentation import instruments, Instruments
+
 # myappid = u'pqvqn.brainstormer.prototype.2'
 # ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(myappid)
 
-from PyQt5.QtCore import Qt, QCoreApplication, QDir, pyqtSignal, QDateTime
-from PyQt5.QtGui import QTextCharFormat, QTextCursor, QFont, QIcon, QColor, QBrush
+from PyQt5.QtCore import Qt, QCoreApplication, QDir, pyqtSignal, QTimer, QThread, QAbstractTableModel, QModelIndex
+from PyQt5.QtGui import QTextCharFormat, QTextCursor, QFont, QIcon, QColor, QBrush, QTextDocument, QTextFormat
 from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QHBoxLayout, QTextEdit, QVBoxLayout, QLabel, QLineEdit, \
-    QFileDialog, QInputDialog, QMessageBox, QGroupBox, QGridLayout, QCheckBox, QSpinBox, QComboBox, QDoubleSpinBox
+    QFileDialog, QInputDialog, QMessageBox, QGroupBox, QGridLayout, QCheckBox, QSpinBox, QComboBox, QDoubleSpinBox, \
+    QTreeView, QAbstractItemView, QHeaderView, QProgressBar, QPushButton
 
 
 class View(QMainWindow):
 
+    LoadChunk = 20000
+    PreviewChunk = 1000
+    ProgressSteps = 1000
+    TraceVariable = "BRAINSTORMER_TRACE"
+    SaveFilters = {"BUG file (*.bug)": ".bug",
+                   "Compact BUG file (*.bugc)": ".bugc",
+                   "Gzip-compressed BUG file (*.bug.gz)": ".bug.gz",
+                   "XZ-compressed BUG file (*.bug.xz)": ".bug.xz",
+                   "Gzip-compressed compact BUG file (*.bugc.gz)": ".bugc.gz",
+                   "XZ-compressed compact BUG file (*.bugc.xz)": ".bugc.xz"}
+    OpenFilter = "BUG file (*.bug *.bugc *.bug.gz *.bug.xz *.bugc.gz *.bugc.xz)"
+
     def __init__(self, open_path=""):
         super(QMainWindow, self).__init__()
 
         self.window_title = "Brainstormer Second Prototype"
 
+        if os.environ.get(View.TraceVariable):
+            instruments.enable(os.environ[View.TraceVariable])
+        instruments.listeners.append(self.show_instruments)
+
         # self.setWindowIcon(QIcon("...")) replace with path
 
         self.model = Model()
-        self.saved_path = open_path
-        if open_path == "":
-            self.has_unsaved = False
-            self.model.new_model("-")
-        else:
-            self.has_unsaved = False
-            self.model.read_from_file(open_path)
-
-        self.update_window_title()
+        self.model.new_model("-")
+        self.load_thread = None
+        self.resume_post = None
+        self.save_thread = None
+        self.queued_save = None
+        self.saved_path = ""
+        self.has_unsaved = False
 
         widget = QWidget()
         self.setCentralWidget(widget)
@@ -46,23 +65,44 @@ class View(QMainWindow):
         doc_layout = QHBoxLayout()
         self.info_doc = InfoDoc()
         doc_layout.addWidget(self.info_doc)
+        self.page_view = PageView(self)
+        self.page_view.hide()
+        doc_layout.addWidget(self.page_view)
         self.main_doc = MainDoc(self.model, self)
         doc_layout.addWidget(self.main_doc)
+        self.vis_settings.virtual_view.stateChanged.connect(
+            lambda: self.set_virtual_view(self.vis_settings.virtual_view.isChecked()))
 
         task_layout = QHBoxLayout()
         self.write_box = WriteBox(self.model, self)
         self.author_select = QComboBox()
         self.author_select.setEditable(True)
         self.author_select.setInsertPolicy(QComboBox.InsertAtBottom)
-        for a in self.model.authors:
-            self.author_select.addItem(a)
+        self.listed_authors = 0
+        self.sync_authors()
+        self.search_box = SearchBox(self.model, self)
         task_layout.addWidget(self.author_select)
+        task_layout.addWidget(self.search_box)
         task_layout.addWidget(self.write_box)
         task_layout.addWidget(self.vis_settings)
 
         v_layout.addLayout(doc_layout)
         v_layout.addLayout(task_layout)
 
+        self.load_progress = QProgressBar()
+        self.load_progress.setRange(0, View.ProgressSteps)
+        self.load_cancel = QPushButton("Cancel")
+        self.load_cancel.clicked.connect(self.stop_loading)
+        self.statusBar().addPermanentWidget(self.load_progress)
+        self.statusBar().addPermanentWidget(self.load_cancel)
+        self.load_progress.hide()
+        self.load_cancel.hide()
+
+        self.update_window_title()
+        if open_path != "":
+            self.show_model(self.model, read_only=True)
+            self.start_loading(open_path)
+
         self.showMaximized()
 
     def closeEvent(self, e):
@@ -71,6 +111,124 @@ class View(QMainWindow):
             continue_on = self.ask_unsaved()
             if continue_on:
                 e.accept()
+        if e.isAccepted():
+            self.stop_loading()
+            for thread in self.findChildren(LoadThread):
+                thread.wait()
+            self.wait_for_save()
+            if self.show_instruments in instruments.listeners:
+                instruments.listeners.remove(self.show_instruments)
+
+    def start_loading(self, path):
+        self.stop_loading()
+        thread = LoadThread(path, self.model.version, self)
+        thread.progressed.connect(self.show_load_progress)
+        thread.previewed.connect(lambda: self.show_preview(thread))
+        thread.finished.connect(lambda: self.finish_loading(thread))
+        self.load_thread = thread
+        self.load_progress.setValue(0)
+        self.load_progress.show()
+        self.load_cancel.show()
+        thread.start()
+        self.show_load_progress()
+
+    def show_load_progress(self):
+        thread = self.load_thread
+        if thread is None:
+            return
+        self.load_progress.setValue(int(thread.progress() * View.ProgressSteps))
+        self.statusBar().showMessage("Loading " + thread.path + ": " + str(len(thread.model.store)) + " posts")
+        self.update_window_title()
+
+    def stop_loading(self):
+        if self.load_thread is not None:
+            self.load_thread.cancelled = True
+            self.load_thread = None
+            self.load_progress.hide()
+            self.load_cancel.hide()
+            self.restore_model()
+            self.statusBar().showMessage("Loading cancelled")
+            self.update_window_title()
+
+    def show_preview(self, thread):
+        if thread is not self.load_thread:
+            return
+        if self.main_doc.model is self.model:
+            self.resume_post = self.main_doc.page.post
+        self.show_model(thread.preview, read_only=True)
+        self.main_doc.loadPage(thread.preview.time_ordered[0], new_doc=True)
+
+    def restore_model(self):
+        previewing = self.main_doc.model is not self.model
+        self.show_model(self.model)
+        if previewing:
+            self.write_box.setParent(None)
+            self.write_box.setDestination(None)
+            self.search_box.line_edit.setText("")
+            self.main_doc.loadPage(self.resume_post, new_doc=True)
+            self.resume_post = None
+
+    def finish_loading(self, thread):
+        thread.wait()
+        thread.deleteLater()
+        if thread is not self.load_thread:
+            return
+        self.load_thread = None
+        self.load_progress.hide()
+        self.load_cancel.hide()
+        if thread.error is not None:
+            self.restore_model()
+            self.update_window_title()
+            QMessageBox.warning(self, "Open failed", "Could not open " + thread.path + ":\n" + str(thread.error))
+            return
+        if self.has_unsaved and self.model.version != thread.replaced_version and not self.ask_unsaved():
+            self.restore_model()
+            self.update_window_title()
+            self.statusBar().showMessage("Discarded " + thread.path)
+            return
+        self.wait_for_save()
+        with instruments.operation("open"):
+            instruments.add_time("load thread", thread.elapsed)
+            self.set_model(thread.model)
+            self.saved_path = thread.path
+            self.has_unsaved = False
+            self.update_window_title()
+            self.prep_new_model()
+        self.statusBar().showMessage("Loaded " + str(len(self.model.store)) + " posts from " + thread.path)
+
+    def set_model(self, model):
+        self.model = model
+        self.resume_post = None
+        self.show_model(model)
+
+    def show_model(self, model, read_only=False):
+        self.main_doc.layout_scheduler.cancel()
+        self.main_doc.model = model
+        self.main_doc.read_only = read_only
+        self.write_box.model = model
+        self.write_box.setEnabled(not read_only)
+        self.search_box.model = model
+
+    def set_virtual_view(self, virtual):
+        self.info_doc.setVisible(not virtual)
+        self.main_doc.setVisible(not virtual)
+        self.page_view.setVisible(virtual)
+        self.main_doc.setVirtual(virtual)
+        if virtual:
+            self.page_view.setFocus()
+        else:
+            self.main_doc.setFocus()
+
+    def show_instruments(self, record):
+        self.statusBar().showMessage(Instruments.readout(record))
+
+    def toggle_instruments(self):
+        if instruments.enabled:
+            instruments.disable()
+            self.statusBar().showMessage("Instrumentation off")
+        else:
+            instruments.enable(os.environ.get(View.TraceVariable) or None)
+            self.statusBar().showMessage("Instrumentation on")
 
     def change_made(self):
         if not self.has_unsaved:
@@ -81,24 +239,63 @@ class View(QMainWindow):
         title = os.path.basename(self.saved_path)
         if self.has_unsaved:
             title = "*"+title
+        if self.load_thread is not None:
+            title = "Loading " + str(int(self.load_thread.progress() * 100)) + "% - " + title
+        elif self.save_thread is not None:
+            title = "Saving - " + title
         self.setWindowTitle(title + " - " + self.window_title)
 
+    def start_save(self, path, full=None):
+        if self.save_thread is not None:
+            self.queued_save = (path, full)
+            return
+        thread = SaveThread(self.model.begin_save(path, full), self)
+        thread.finished.connect(self.save_finished)
+        self.save_thread = thread
+        thread.start()
+        self.update_window_title()
+
+    def save_finished(self):
+        self.finish_save(self.sender())
+
+    def finish_save(self, thread):
+        if thread is not self.save_thread:
+            return
+        job = thread.job
+        thread.wait()
+        thread.deleteLater()
+        self.save_thread = None
+        if self.model.finish_save(job):
+            if job.path == self.saved_path and self.model.version == job.version:
+                self.has_unsaved = False
+            self.statusBar().showMessage("Saved " + str(job.count) + " posts to " + job.path)
+        else:
+            self.has_unsaved = True
+            QMessageBox.warning(self, "Save failed", "Could not save " + job.path + ":\n" + str(job.error))
+        self.update_window_title()
+        if self.queued_save is not None:
+            path, full = self.queued_save
+            self.queued_save = None
+            self.start_save(path, full)
+
+    def wait_for_save(self):
+        while self.save_thread is not None:
+            self.finish_save(self.save_thread)
+
     def ask_save(self):
         if self.saved_path == "":
             self.ask_save_as()
         else:
-            self.model.write_to_file(self.saved_path)
-            self.has_unsaved = False
-            self.update_window_title()
+            self.start_save(self.saved_path)
 
     def ask_save_as(self):
         folder = QDir.homePath() if self.saved_path == "" else self.saved_path
-        path = QFileDialog.getSaveFileName(self, "Save Graph", folder, "BUG file (*.bug)")[0]
+        path, file_filter = QFileDialog.getSaveFileName(self, "Save Graph", folder, ";;".join(View.SaveFilters))
         if path is not None and path != "":
-            self.model.write_to_file(path)
+            if not path.endswith(tuple(View.SaveFilters.values())):
+                path += View.SaveFilters.get(file_filter, "")
             self.saved_path = path
-            self.has_unsaved = False
-            self.update_window_title()
+            self.start_save(path, full=True)
 
     def ask_unsaved(self):
 
@@ -124,13 +321,9 @@ class View(QMainWindow):
                 return
 
         folder = QDir.homePath() if self.saved_path == "" else self.saved_path
-        path = QFileDialog.getOpenFileName(self, "Open Graph", folder, "BUG file (*.bug)")[0]
+        path = QFileDialog.getOpenFileName(self, "Open Graph", folder, View.OpenFilter)[0]
         if path is not None and path != "":
-            self.model.read_from_file(path)
-            self.saved_path = path
-            self.has_unsaved = False
-            self.update_window_title()
-            self.prep_new_model()
+            self.start_loading(path)
 
     def ask_new(self):
         if self.has_unsaved:
@@ -140,6 +333,8 @@ class View(QMainWindow):
 
         title = QInputDialog.getText(self, "New Graph Dialog", "Enter first post text:")[0]
         if title is not None and title != "":
+            self.stop_loading()
+            self.wait_for_save()
             self.model.new_model(title, author=self.author_select.currentText())
             self.saved_path = ""
             self.has_unsaved = True
@@ -150,11 +345,20 @@ class View(QMainWindow):
         self.write_box.setParent(None)
         self.write_box.setDestination(None)
         self.write_box.line_edit.setText("")
+        self.write_box.setEnabled(True)
+        self.search_box.line_edit.setText("")
         self.author_select.clear()
-        for a in self.model.authors:
-            self.author_select.addItem(a)
+        self.listed_authors = 0
+        self.sync_authors()
         self.main_doc.loadPage(self.model.time_ordered[0], new_doc=True)
 
+    def sync_authors(self):
+        names = self.model.store.author_names
+        for name in names[self.listed_authors:]:
+            if name != "" and self.author_select.findText(name) < 0:
+                self.author_select.addItem(name)
+        self.listed_authors = len(names)
+
     def keyPressEvent(self, e):
         if e.key() == Qt.Key_S and e.modifiers() & Qt.ControlModifier:
             if e.modifiers() & Qt.ShiftModifier:
@@ -165,143 +369,14 @@ class View(QMainWindow):
             self.ask_open()
         elif e.key() == Qt.Key_N and e.modifiers() & Qt.ControlModifier:
             self.ask_new()
+        elif e.key() == Qt.Key_I and e.modifiers() & Qt.ControlModifier:
+            self.toggle_instruments()
+        elif e.key() == Qt.Key_F and e.modifiers() & Qt.ControlModifier:
+            self.search_box.line_edit.setFocus()
+            self.search_box.line_edit.selectAll()
         else:
             QMainWindow.keyPressEvent(self, e)
 
-class Post:
-    Suppress = -1
-    Neutral = 0
-    Canon = 1
-
-    def __init__(self, ident, parent, destination, text, score=0, auxiliary=0, author="", timestamp=None):
-        self.ident = ident
-        self.text = text
-        self.auxiliary = auxiliary
-        self.score = score
-        self.score_vis = self.visFromScore(self.score)
-        self.canon_score = 0
-        self.suppress_score = 0
-        self.parent = parent
-        self.destination = destination
-        self.author = author
-        self.timestamp = timestamp
-        if parent is not None:
-            parent.linkChild(self)
-            if self.auxiliary != Post.Neutral:
-                self.suppress_score = -1
-                parent.auxFormalityChanged(self, True)
-        if destination is not None:
-            destination.linkSource(self)
-        self.children = []
-        self.sources = []
-
-    def addScore(self, amt):
-        self.score += amt
-        self.score_vis = self.visFromScore(self.score)
-
-    def visFromScore(self, score):
-        return 1 / (1 + numpy.exp(-0.5 * score))
-
-    def formality(self):
-        return numpy.sign(numpy.sign(self.canon_score) - numpy.sign(self.suppress_score))
-
-    def auxFormalityChanged(self, aux, is_upgrade):
-        pre_type = self.formality()
-        amt = 1 if is_upgrade else -1
-
-        if aux.auxiliary == Post.Canon:
-            self.canon_score += amt
-        elif aux.auxiliary == Post.Suppress:
-            self.suppress_score += amt
-
-        post_type = self.formality()
-        if self.auxiliary != Post.Neutral and self.parent is not None:
-            if pre_type != Post.Canon and post_type == Post.Canon:
-                self.parent.auxFormalityChanged(self, True)
-            elif pre_type == Post.Canon and post_type != Post.Canon:
-                self.parent.auxFormalityChanged(self, False)
-
-
-    def linkChild(self, post):
-        self.children.append(post)
-
-    def linkSource(self, post):
-        self.sources.append(post)
-
-
-class Model:
-    arrow = ">"
-    separator = "|"
-    empty = "_"
-
-    def __init__(self):
-        self.time_ordered = []
-        self.authors = []
-
-    def add_post(self, parent, destination, text, score=0, auxiliary=Post.Neutral, author=""):
-        epoch = QDateTime.fromSecsSinceEpoch(int(time.time()))
-        post = Post("X"+str(len(self.time_ordered)), parent, destination, text,
-                    score=score, author=author, timestamp=epoch, auxiliary=auxiliary)
-        self.time_ordered.append(post)
-        return post
-
-    def new_model(self, title, author=""):
-        epoch = QDateTime.fromSecsSinceEpoch(int(time.time()))
-        self.time_ordered = [Post("X0", None, None, title, author=author, timestamp=epoch)]
-        if author == "":
-            self.authors = []
-        else:
-            self.authors = [author]
-
-    def encode_post(self, post):
-        sep = self.separator
-        p = post.parent.ident if post.parent is not None else self.empty
-        d = post.destination.ident if post.destination is not None else self.empty
-        s = str(post.score) if post.score != 0 else ""
-        f = ""
-        if post.auxiliary == Post.Canon:
-            f = "+"
-        elif post.auxiliary == Post.Suppress:
-            f = "-"
-        a = post.author
-        t = str(post.timestamp.toSecsSinceEpoch()) if post.timestamp is not None else ""
-
-        return p+self.arrow+post.ident+self.arrow+d+sep+post.text+sep+s+sep+f+sep+a+sep+t+sep
-
-    def decode_post(self, line, prev_posts):
-        parts = line.split(self.separator)
-        idents = parts[0].split(self.arrow)
-        parent = prev_posts[idents[0]] if idents[0] != self.empty else None
-        destination = prev_posts[idents[2]] if idents[2] != self.empty else None
-        score = 0 if parts[2] == "" else int(parts[2])
-        auxiliary = Post.Neutral
-        if parts[3] == "+":
-            auxiliary = Post.Canon
-        elif parts[3] == "-":
-            auxiliary = Post.Suppress
-        author = parts[4]
-        timestamp = None if parts[5] == "" else QDateTime.fromSecsSinceEpoch(int(parts[5]))
-        return Post(idents[1], parent, destination, parts[1],
-                    score=score, auxiliary=auxiliary, author=author, timestamp=timestamp)
-
-    def read_from_file(self, path):
-        self.time_ordered = []
-        self.authors = []
-        curr_posts = {}
-        with open(path, 'r', encoding="utf-8") as file:
-            for line in file:
-                new_post = self.decode_post(line, curr_posts)
-                self.time_ordered.append(new_post)
-                if new_post.author != "" and new_post.author not in self.authors:
-                    self.authors.append(new_post.author)
-                curr_posts[new_post.ident] = new_post
-
-    def write_to_file(self, path):
-        with open(path, 'w', encoding="utf-8") as file:
-            for post in self.time_ordered:
-                file.write(self.encode_post(post)+"\n")
-
-
 class WriteBox(QWidget):
     def __init__(self, model, view):
         super(QWidget, self).__init__()
@@ -353,12 +428,12 @@ class WriteBox(QWidget):
             auxiliary = Post.Suppress
             text = text[1:]
 
-        self.model.add_post(self.parent_post, self.destination_post, text, auxiliary=auxiliary,
-                            author=self.view.author_select.currentText())
+        post = self.model.add_post(self.parent_post, self.destination_post, text, auxiliary=auxiliary,
+                                   author=self.view.author_select.currentText())
         self.line_edit.setText("")
         self.setParent(None)
         self.setDestination(None)
-        self.view.main_doc.loadPage(self.view.main_doc.page.post)
+        self.view.main_doc.updatePage(post)
         self.view.main_doc.setFocus()
         self.view.change_made()
 
@@ -372,6 +447,100 @@ class WriteBox(QWidget):
             QWidget.keyPressEvent(self, e)
 
 
+class LoadThread(QThread):
+    progressed = pyqtSignal()
+    previewed = pyqtSignal()
+
+    def __init__(self, path, replaced_version, parent):
+        super(QThread, self).__init__(parent)
+        self.path = path
+        self.replaced_version = replaced_version
+        self.model = Model()
+        self.loader = None
+        self.preview = None
+        self.cancelled = False
+        self.error = None
+        self.elapsed = 0.0
+
+    def progress(self):
+        return self.loader.progress() if self.loader is not None else 0
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            self.loader = ModelLoader(self.model, self.path)
+            self.loader.load_chunk(View.PreviewChunk)
+            if not self.loader.done:
+                self.preview = self.model.copy()
+                self.previewed.emit()
+            while not self.loader.done:
+                if self.cancelled:
+                    self.loader.cancel()
+                    break
+                self.loader.load_chunk(View.LoadChunk)
+                self.progressed.emit()
+        except Exception as e:
+            self.error = e
+            if self.loader is not None and not self.loader.done:
+                self.loader.cancel()
+        self.elapsed = time.perf_counter() - start
+
+
+class SaveThread(QThread):
+
+    def __init__(self, job, parent):
+        super(QThread, self).__init__(parent)
+        self.job = job
+
+    def run(self):
+        self.job.run()
+
+
+class SearchBox(QWidget):
+
+    MaxResults = 200
+
+    def __init__(self, model, view):
+        super(QWidget, self).__init__()
+
+        self.model = model
+        self.view = view
+        self.matches = []
+
+        v_layout = QVBoxLayout()
+        self.line_edit = QLineEdit()
+        self.line_edit.setPlaceholderText("Search (Ctrl+F)")
+        self.line_edit.textChanged.connect(self.search)
+        self.results = QComboBox()
+        self.results.setMinimumContentsLength(30)
+        self.results.activated.connect(self.openResult)
+        v_layout.addWidget(self.line_edit)
+        v_layout.addWidget(self.results)
+        self.setLayout(v_layout)
+
+    def search(self):
+        with instruments.operation("search"):
+            self.matches = self.model.search(self.line_edit.text(), SearchBox.MaxResults)
+        self.results.clear()
+        for post in self.matches:
+            text = post.text if len(post.text) <= 60 else post.text[:57] + "..."
+            self.results.addItem(self.model.format_ident(post.ident) + ": " + text)
+
+    def openResult(self, index):
+        if 0 <= index < len(self.matches):
+            self.view.main_doc.loadPage(self.matches[index], add_to_stack=True)
+            self.view.main_doc.setFocus()
+
+    def keyPressEvent(self, e):
+        if e.key() == Qt.Key_Return:
+            self.openResult(self.results.currentIndex())
+        elif e.key() == Qt.Key_Escape:
+            self.line_edit.setText("")
+            self.view.main_doc.setFocus()
+        else:
+            QWidget.keyPressEvent(self, e)
+
+
 class VisibilitySettings(QGroupBox):
     def __init__(self):
         super(QGroupBox, self).__init__()
@@ -388,6 +557,8 @@ class VisibilitySettings(QGroupBox):
         self.separate_formality = QCheckBox("Separate formality")
         self.separate_formality.setChecked(True)
         layout.addWidget(self.separate_formality, 0, 4, 1, 2)
+        self.virtual_view = QCheckBox("Virtual view")
+        layout.addWidget(self.virtual_view, 0, 6)
         layout.addWidget(QLabel("Sorting method:"), 1, 0)
         self.sorting_method = QComboBox()
         for method in LinearTree.SortingMethods:
@@ -406,8 +577,38 @@ class VisibilitySettings(QGroupBox):
         self.depth_threshold.setValue(5)
         self.depth_threshold.setSingleStep(0.5)
         layout.addWidget(self.depth_threshold, 1, 5)
+        layout.addWidget(QLabel("Time window:"), 1, 6)
+        self.time_window = QComboBox()
+        for time_window in LayoutSettings.TimeWindows:
+            self.time_window.addItem(time_window)
+        layout.addWidget(self.time_window, 1, 7)
+        layout.addWidget(QLabel("Authors:"), 2, 0)
+        self.filter_authors = QLineEdit()
+        self.filter_authors.setPlaceholderText("name, name, ...")
+        layout.addWidget(self.filter_authors, 2, 1, 1, 3)
+        layout.addWidget(QLabel("Author filter:"), 2, 4)
+        self.author_filter = QComboBox()
+        for author_filter in LayoutSettings.AuthorFilters:
+            self.author_filter.addItem(author_filter)
+        layout.addWidget(self.author_filter, 2, 5)
         self.setLayout(layout)
 
+    def layoutSettings(self):
+        settings = LayoutSettings(show_ellipses=self.show_ellipses.isChecked(),
+                                  collapse_repeats=self.collapse_repeats.isChecked(),
+                                  separate_formality=self.separate_formality.isChecked(),
+                                  sort_method=self.sorting_method.currentText(),
+                                  direction_bias=self.direction_bias.value(),
+                                  depth_threshold=self.depth_threshold.value(),
+                                  authors=tuple(name.strip() for name in self.filter_authors.text().split(",")
+                                                if name.strip() != ""),
+                                  author_filter=self.author_filter.currentText(),
+                                  time_window=LayoutSettings.TimeWindows[self.time_window.currentText()])
+        if self.virtual_view.isChecked():
+            settings.max_lines = LayoutSettings.VirtualMaxLines
+            settings.max_expanded = LayoutSettings.VirtualMaxExpanded
+        return settings
+
 
 class LinearTree:
     Root = 0
@@ -416,12 +617,14 @@ class LinearTree:
     Source = 2
     Destination = -2
 
+    MaxEllipses = 4
+
     SortingMethods = {
-        "best": lambda x: sorted(x, reverse=True, key=lambda c: c.score_vis),
-        "worst": lambda x: sorted(x, reverse=False, key=lambda c: c.score_vis),
-        "oldest": lambda x: list(x),
-        "newest": lambda x: list(reversed(x)),
-        "random": lambda x: random.sample(x, len(x))
+        "best": lambda x, store, rng: x[numpy.argsort(-store.column("score_vis")[x], kind="stable")],
+        "worst": lambda x, store, rng: x[numpy.argsort(store.column("score_vis")[x], kind="stable")],
+        "oldest": lambda x, store, rng: x,
+        "newest": lambda x, store, rng: x[::-1],
+        "random": lambda x, store, rng: x[rng.sample(range(len(x)), len(x))]
     }
 
     def __init__(self, post, heading, kind, visibility, override=""):
@@ -434,8 +637,10 @@ class LinearTree:
         self.override = override
         self.kind = kind
         self.visibility = visibility
+        self.highlight = False
 
-    def expand(self, show_ellipses, separate_formality, forward_weight, backward_weight, view_threshold, sort_method):
+    def expand(self, show_ellipses, separate_formality, forward_weight, backward_weight, view_threshold, sort_method,
+               room=None, rng=random, authors=None, window=None):
         new_trees = []
 
         above_ellipsis = False
@@ -461,14 +666,22 @@ class LinearTree:
                 below_ellipsis = True
                 self.belows.append(LinearTree(self.post.destination, self, LinearTree.Destination, vis, override="..."))
 
-        sorted_children = LinearTree.SortingMethods[sort_method](self.post.children)
+        store = self.post.store
+        store.refresh_stale()
+        with instruments.span("sort"):
+            sorted_children = LinearTree.SortingMethods[sort_method](store.children_of(self.post.row), store, rng)
+            if authors is not None:
+                sorted_children = sorted_children[numpy.isin(store.column("author")[sorted_children], authors)]
+            if window is not None:
+                sorted_children = sorted_children[numpy.isin(sorted_children, window)]
         children_patience = 1
         if separate_formality:
-            sorted_children.sort(reverse=True, key=lambda x: x.formality())
-        for child in sorted_children:
+            sorted_children = sorted_children[numpy.argsort(-store.column("formality")[sorted_children], kind="stable")]
+        for row, score_vis in zip(sorted_children.tolist(), store.column("score_vis")[sorted_children].tolist()):
+            child = Post(store, row)
             if self.kind != LinearTree.Parent or child != self.heading.post:
-                vis = self.visibility * forward_weight * child.score_vis
-                if vis * children_patience < view_threshold:
+                vis = self.visibility * forward_weight * score_vis
+                if vis * children_patience < view_threshold or self.full(room):
                     if show_ellipses and not below_ellipsis:
                         self.belows.append(LinearTree(child, self, LinearTree.Child, vis, override="..."))
                     break
@@ -477,12 +690,17 @@ class LinearTree:
                 new_trees.append(new_tree)
                 children_patience *= self.visibility
 
-        sorted_sources = LinearTree.SortingMethods[sort_method](self.post.sources)
+        with instruments.span("sort"):
+            sorted_sources = LinearTree.SortingMethods[sort_method](store.sources_of(self.post.row), store, rng)
+            if authors is not None:
+                sorted_sources = sorted_sources[numpy.isin(store.column("author")[sorted_sources], authors)]
+            if window is not None:
+                sorted_sources = sorted_sources[numpy.isin(sorted_sources, window)]
         sources_patience = 1
-        for source in sorted_sources:
+        for source in [Post(store, row) for row in sorted_sources.tolist()]:
             if self.kind != LinearTree.Destination or source != self.heading.post:
                 vis = self.visibility * backward_weight ** 2
-                if vis * sources_patience < view_threshold:
+                if vis * sources_patience < view_threshold or self.full(room):
                     if show_ellipses and not above_ellipsis:
                         self.aboves.append(LinearTree(source, self, LinearTree.Source, vis, override="..."))
                     break
@@ -493,6 +711,26 @@ class LinearTree:
 
         return new_trees
 
+    def full(self, room):
+        return room is not None and len(self.aboves) + len(self.belows) >= room
+
+    def ellipsize(self):
+        store = self.post.store
+        if self.kind != LinearTree.Child and self.post.parent is not None:
+            self.aboves.append(LinearTree(self.post.parent, self, LinearTree.Parent, 0, override="..."))
+        if self.kind != LinearTree.Source and self.post.destination is not None:
+            self.belows.append(LinearTree(self.post.destination, self, LinearTree.Destination, 0, override="..."))
+        else:
+            for row in store.children_of(self.post.row)[:2].tolist():
+                if self.kind != LinearTree.Parent or row != self.heading.post.row:
+                    self.belows.append(LinearTree(Post(store, row), self, LinearTree.Child, 0, override="..."))
+                    break
+        if len(self.aboves) == 0:
+            for row in store.sources_of(self.post.row)[:2].tolist():
+                if self.kind != LinearTree.Destination or row != self.heading.post.row:
+                    self.aboves.append(LinearTree(Post(store, row), self, LinearTree.Source, 0, override="..."))
+                    break
+
     def set_line_num(self, num):
         self.line_num = num
 
@@ -513,152 +751,181 @@ class LinearTree:
             return None
 
 
-class MainDoc(QTextEdit):
-
+class LayoutSettings:
     VisAvg = 0.4
-    Tab = ":     "
-    DefaultFormat = QTextCharFormat()
-    CanonFormat = QTextCharFormat()
-    #CanonFormat.setFontUnderline(True)
-    SuppressFormat = QTextCharFormat()
-    #SuppressFormat.setFontStrikeOut(True)
-    AboveFormat = QTextCharFormat()
-    #AboveFormat.setForeground(QBrush(QColor(160, 160, 160), Qt.SolidPattern))
-
-    def __init__(self, model, view):
-        super(QTextEdit, self).__init__()
-
-        self.setReadOnly(True)
-        self.model = model
-        self.view = view
-
-        self.linear_list = []
-        self.sel_line = 0
-
-        self.back_stack = []
-        self.back_pointer = 0
-
+    VirtualMaxLines = 100000
+    VirtualMaxExpanded = 50000
+    AuthorFilters = ["none", "highlight", "restrict"]
+    TimeWindows = {"all time": None, "last hour": 3600, "last day": 86400, "last week": 7 * 86400,
+                   "last month": 30 * 86400}
+    WindowSteps = 60
+
+    def __init__(self, show_ellipses=True, collapse_repeats=True, separate_formality=True, sort_method="best",
+                 direction_bias=0.5, depth_threshold=5, max_lines=10000, max_expanded=5000, time_budget=1.0,
+                 seed=None, authors=(), author_filter="none", time_window=None):
+        self.show_ellipses = show_ellipses
+        self.collapse_repeats = collapse_repeats
+        self.separate_formality = separate_formality
+        self.sort_method = sort_method
+        self.direction_bias = direction_bias
+        self.depth_threshold = depth_threshold
+        self.max_lines = max_lines
+        self.max_expanded = max_expanded
+        self.time_budget = time_budget
+        self.seed = seed
+        self.authors = authors
+        self.author_filter = author_filter
+        self.time_window = time_window
+        self.since = None
+        if time_window is not None:
+            step = max(time_window // LayoutSettings.WindowSteps, 1)
+            self.since = int(time.time()) // step * step - time_window
+
+    def key(self):
+        return (self.show_ellipses, self.collapse_repeats, self.separate_formality, self.sort_method,
+                self.direction_bias, self.depth_threshold, self.max_lines, self.max_expanded, self.time_budget,
+                self.authors, self.author_filter, self.time_window, self.since)
+
+    def forward_weight(self):
+        return (self.direction_bias + 1) * LayoutSettings.VisAvg
+
+    def backward_weight(self):
+        return (self.direction_bias - 1) * -1 * LayoutSettings.VisAvg
+
+    def view_threshold(self):
+        return LayoutSettings.VisAvg ** self.depth_threshold
+
+
+class PageLayout:
+
+    def __init__(self, root, settings):
+        self.root = root
+        self.settings = settings
         self.page = None
-        self.loadPage(self.model.time_ordered[0], new_doc=True)
-
-        self.cursorPositionChanged.connect(lambda: self.setSelectLine(self.textCursor().blockNumber()))
-
-        self.view.vis_settings.show_ellipses.stateChanged.connect(lambda: self.loadPage(self.page.post))
-        self.view.vis_settings.collapse_repeats.stateChanged.connect(lambda: self.loadPage(self.page.post))
-        self.view.vis_settings.separate_formality.stateChanged.connect(lambda: self.loadPage(self.page.post))
-        self.view.vis_settings.direction_bias.valueChanged.connect(lambda: self.loadPage(self.page.post))
-        self.view.vis_settings.depth_threshold.valueChanged.connect(lambda: self.loadPage(self.page.post))
-        self.view.vis_settings.sorting_method.currentTextChanged.connect(lambda: self.loadPage(self.page.post))
-
-        self.verticalScrollBar().valueChanged.connect(self.view.info_doc.verticalScrollBar().setValue)
-
-    def setSelectLine(self, pos):
-        self.sel_line = pos
-
-    def loadPage(self, root, new_doc=False, add_to_stack=False):
-
-        trace = None
-        if self.page is not None and self.page.post == root and self.sel_valid():
-            trace = []
-            curr = self.linear_list[self.sel_line][1]
-            while curr.heading is not None:
-                trace.append((curr.post, curr.kind))
-                curr = curr.heading
-
-        self.setText("")
-
-        if new_doc:
-            self.back_stack = [root]
-            self.back_pointer = 0
-        elif add_to_stack:
-            self.back_stack = self.back_stack[:self.back_pointer+1]
-            self.back_stack.append(root)
-            if len(self.back_stack) > 20:
-                self.back_stack.pop(0)
+        self.lines = []
+        self.repeats = {}
+        self.truncated = False
+        self.navigation = None
+        self.frontier = []
+        self.pushed = 0
+        self.expanded = 0
+        self.line_count = 0
+        self.elapsed = 0.0
+        self.rng = random.Random(settings.seed)
+        self.restrict = None
+        self.highlight = None
+        if len(settings.authors) > 0 and settings.author_filter != "none":
+            author_ids = root.store.author_ids
+            selected = sorted(author_ids[name] for name in settings.authors if name in author_ids)
+            if settings.author_filter == "restrict":
+                self.restrict = numpy.array(selected, dtype=numpy.int32)
             else:
-                self.back_pointer += 1
-
-        self.page = LinearTree(root, None, LinearTree.Root, 1)
-        visibility_queue = [self.page]
-        repeats_dict = {root: [self.page]}
-        show_ellipses = self.view.vis_settings.show_ellipses.isChecked()
-        collapse_repeats = self.view.vis_settings.collapse_repeats.isChecked()
-        separate_formality = self.view.vis_settings.separate_formality.isChecked()
-        forward_weight = (self.view.vis_settings.direction_bias.value() + 1) * MainDoc.VisAvg
-        backward_weight = (self.view.vis_settings.direction_bias.value() - 1) * -1 * MainDoc.VisAvg
-        view_threshold = MainDoc.VisAvg ** self.view.vis_settings.depth_threshold.value()
-        sort_method = self.view.vis_settings.sorting_method.currentText()
-        while len(visibility_queue) > 0:
-            curr = visibility_queue.pop()
-            extend = curr.expand(show_ellipses, separate_formality, forward_weight, backward_weight, view_threshold,
-                                 sort_method)
+                self.highlight = set(selected)
+        self.window = None
+        if settings.time_window is not None:
+            self.window = PageLayout.activeRows(root.store, settings.since)
+
+    def compute(self):
+        self.start()
+        self.advance()
+        return self.finish()
+
+    def start(self):
+        self.page = LinearTree(self.root, None, LinearTree.Root, 1)
+        self.frontier = [(-self.page.visibility, 0, self.page)]
+        self.pushed = 1
+        self.expanded = 0
+        self.line_count = 1
+        self.elapsed = 0.0
+        self.repeats = {self.root: [self.page]}
+        return self
+
+    def advance(self, slice_time=None):
+        settings = self.settings
+        frontier = self.frontier
+        started = time.perf_counter()
+        forward_weight = settings.forward_weight()
+        backward_weight = settings.backward_weight()
+        view_threshold = settings.view_threshold()
+        while len(frontier) > 0:
+            spent = time.perf_counter() - started
+            reserved = self.line_count + LinearTree.MaxEllipses * len(frontier)
+            if (settings.max_lines is not None and reserved >= settings.max_lines) or \
+               (settings.max_expanded is not None and self.expanded >= settings.max_expanded) or \
+               (settings.time_budget is not None and self.elapsed + spent > settings.time_budget):
+                self.truncate([entry[2] for entry in frontier])
+                frontier.clear()
+                break
+            if slice_time is not None and spent > slice_time:
+                self.elapsed += spent
+                return False
+            curr = heapq.heappop(frontier)[2]
+            room = None
+            if settings.max_lines is not None:
+                room = (settings.max_lines - reserved) // (LinearTree.MaxEllipses + 1)
+            with instruments.span("expand"):
+                extend = curr.expand(settings.show_ellipses, settings.separate_formality, forward_weight,
+                                     backward_weight, view_threshold, settings.sort_method, room, self.rng,
+                                     self.restrict, self.window)
+            self.expanded += 1
+            self.line_count += len(curr.aboves) + len(curr.belows)
             for e in extend:
-                if collapse_repeats and e.post in repeats_dict:
-                    repeats_dict[e.post].append(e)
+                if settings.collapse_repeats and e.post in self.repeats:
+                    self.repeats[e.post].append(e)
                     if len(e.post.text) <= 30:
                         e.override = e.post.text
                     else:
                         e.override = e.post.text[:27] + "..."
                 else:
-                    if e.post in repeats_dict:
-                        repeats_dict[e.post].append(e)
+                    if e.post in self.repeats:
+                        self.repeats[e.post].append(e)
                     else:
-                        repeats_dict[e.post] = [e]
-                    bisect.insort_left(visibility_queue, e, key=lambda x: e.visibility)
-
-        self.linear_list = []
-        inserter = self.textCursor()
-        inserter.movePosition(QTextCursor.End, QTextCursor.MoveAnchor)
-
-        new_line = self.writeTree(self.page, inserter, 0, self.linear_list, False)
-
-        if collapse_repeats:
-            for post in repeats_dict:
-                if len(repeats_dict[post]) > 1:
-                    expanded_num = repeats_dict[post][0].line_num
-                    for i in range(1, len(repeats_dict[post])):
-                        curr_num = repeats_dict[post][i].line_num
-                        diff = expanded_num - curr_num
-                        suffix = "   " + ("v" if diff > 0 else "^") + str(abs(diff))
-                        cursor = QTextCursor(self.document().findBlockByNumber(curr_num))
-                        cursor.movePosition(QTextCursor.EndOfBlock)
-                        cursor.insertText(suffix)
-
-        self.view.info_doc.sync_text_to(self.linear_list)
-
-        cursor = self.textCursor()
-        cursor.movePosition(QTextCursor.End)
-        self.setTextCursor(cursor)
-
-        if trace is None:
-            self.moveSelector(new_line)
-        else:
-            curr = None
-            next_curr = self.page
-            while len(trace) > 0 and next_curr is not None:
-                curr = next_curr
-                step = trace.pop()
-                next_curr = curr.get_by_kind(step[1], step[0])
-            if next_curr is not None:
-                curr = next_curr
-            self.moveSelector(curr.line_num)
-
-    def writeLine(self, inserter, linetext, tab_count, char_format=DefaultFormat):
-        inserter.setCharFormat(MainDoc.DefaultFormat)
-        inserter.insertText(MainDoc.Tab * tab_count)
-        inserter.setCharFormat(char_format)
-        inserter.insertText(linetext+"\n")
-        inserter.movePosition(QTextCursor.End, QTextCursor.MoveAnchor)
-
-    def writeTree(self, tree, inserter, tabs, linear_list, above):
-        hadBelow = False
-        for a in reversed(tree.aboves):
-            if hadBelow or (a != tree.aboves[-1] and len(a.aboves) > 0):
-                self.writeLine(inserter, "", tabs+1)
-                linear_list.append(tabs+1)
-            self.writeTree(a, inserter, tabs+1, linear_list, True)
-            hadBelow = len(a.belows) > 0
-
+                        self.repeats[e.post] = [e]
+                    heapq.heappush(frontier, (-e.visibility, self.pushed, e))
+                    self.pushed += 1
+        self.elapsed += time.perf_counter() - started
+        return True
+
+    @staticmethod
+    def activeRows(store, since):
+        active = set()
+        parent = store.parent
+        for row in store.rows_between(int(since)):
+            while row >= 0 and row not in active:
+                active.add(row)
+                row = parent[row]
+        return numpy.array(sorted(active), dtype=numpy.int32)
+
+    def finish(self):
+        settings = self.settings
+        instruments.count("posts expanded", self.expanded)
+        self.lines = []
+        with instruments.span("flatten"):
+            self.flatten(self.page, 0, False)
+
+        if settings.collapse_repeats:
+            with instruments.span("repeats"):
+                for post in self.repeats:
+                    if len(self.repeats[post]) > 1:
+                        expanded_num = self.repeats[post][0].line_num
+                        instruments.count("repeats collapsed", len(self.repeats[post]) - 1)
+                        for i in range(1, len(self.repeats[post])):
+                            curr_num = self.repeats[post][i].line_num
+                            diff = expanded_num - curr_num
+                            tabs, tree, text, above = self.lines[curr_num]
+                            suffix = "   " + ("v" if diff > 0 else "^") + str(abs(diff))
+                            self.lines[curr_num] = (tabs, tree, text + suffix, above)
+        with instruments.span("navigation"):
+            self.navigation = NavigationIndex(self.lines)
+        return self
+
+    def truncate(self, trees):
+        self.truncated = True
+        if self.settings.show_ellipses:
+            for tree in trees:
+                tree.ellipsize()
+
+    def lineText(self, tree):
         linetext = ""
 
         if tree.kind == LinearTree.Parent:
@@ -671,13 +938,10 @@ class MainDoc(QTextEdit):
         elif tree.post.auxiliary == Post.Suppress:
             linetext += "[-] "
 
-        char_format = MainDoc.DefaultFormat
         formality = tree.post.formality()
         if formality == Post.Canon:
-            #char_format = MainDoc.CanonFormat
             linetext += "☆ "
         elif formality == Post.Suppress:
-            #char_format = MainDoc.SuppressFormat
             linetext += "🛇 "
 
         if tree.override != "":
@@ -688,81 +952,529 @@ class MainDoc(QTextEdit):
         #linetext += "\t\t\t{"+str(tree.post.canon_score)+","+str(tree.post.suppress_score)+"}"
         # if tree.kind == LinearTree.Child and tree.post.score != 0:
         #     linetext += "     *" + str(tree.post.score)
+        return linetext
 
+    def flatten(self, tree, tabs, above):
+        hadBelow = False
+        for a in reversed(tree.aboves):
+            if hadBelow or (a != tree.aboves[-1] and len(a.aboves) > 0):
+                self.lines.append(tabs+1)
+            self.flatten(a, tabs+1, True)
+            hadBelow = len(a.belows) > 0
 
-
-        if above:
-            char_format = QTextCharFormat(char_format)
-            char_format.merge(MainDoc.AboveFormat)
-
-        self.writeLine(inserter, linetext, tabs, char_format=char_format)
-        pos = len(linear_list)
-        linear_list.append((tabs, tree))
+        pos = len(self.lines)
+        self.lines.append((tabs, tree, self.lineText(tree), above))
         tree.set_line_num(pos)
+        if self.highlight is not None:
+            tree.highlight = tree.post.store.author[tree.post.row] in self.highlight
 
         hadBelow = False
         for b in tree.belows:
             if hadBelow or (b != tree.belows[0] and len(b.aboves) > 0):
-                self.writeLine(inserter, "", tabs+1)
-                linear_list.append(tabs+1)
-            self.writeTree(b, inserter, tabs+1, linear_list, above)
+                self.lines.append(tabs+1)
+            self.flatten(b, tabs+1, above)
             hadBelow = len(b.belows) > 0
 
         return pos
 
+
+class NavigationIndex:
+
+    def __init__(self, lines):
+        count = len(lines)
+        rows = [i for i, line in enumerate(lines) if not isinstance(line, int)]
+        tabs = [lines[i][0] for i in rows]
+
+        lines_at = numpy.arange(count, dtype=numpy.int32)
+        row_array = numpy.array(rows + [-1], dtype=numpy.int32)
+        after = numpy.searchsorted(row_array[:-1], lines_at, side="right")
+        self.below = numpy.where(after < len(rows), row_array[after], lines_at)
+        before = numpy.searchsorted(row_array[:-1], lines_at, side="left") - 1
+        self.above = numpy.where(before >= 0, row_array[before], lines_at)
+
+        self.same_below, self.outer_below, self.inner_below = NavigationIndex.jumps(count, rows, tabs, 1)
+        self.same_above, self.outer_above, self.inner_above = NavigationIndex.jumps(count, rows, tabs, -1)
+
+    @staticmethod
+    def jumps(count, rows, tabs, step):
+        n = len(rows)
+        end = n if step == 1 else -1
+        order = range(n - 1, -1, -1) if step == 1 else range(n)
+        shallower = [end] * n
+        stack = []
+        for k in order:
+            while len(stack) > 0 and tabs[stack[-1]] >= tabs[k]:
+                stack.pop()
+            if len(stack) > 0:
+                shallower[k] = stack[-1]
+            stack.append(k)
+
+        same = numpy.full(count, -1, dtype=numpy.int32)
+        outer = numpy.full(count, -1, dtype=numpy.int32)
+        inner = numpy.full(count, -1, dtype=numpy.int32)
+        settled = count - 1 if step == 1 else 0
+        for k in range(n):
+            t = tabs[k]
+            j = k + step
+            while j != end and tabs[j] > t + 1:
+                j = shallower[j]
+            if j != end and tabs[j] == t + 1:
+                inner[rows[k]] = rows[j]
+            while j != end and tabs[j] > t:
+                j = shallower[j]
+            same[rows[k]] = settled if j == end else rows[j]
+            while j != end and tabs[j] > t - 1:
+                j = shallower[j]
+            if j != end and tabs[j] == t - 1:
+                outer[rows[k]] = rows[j]
+        return same, outer, inner
+
+
+class PageEntry:
+    BytesPerChar = 16
+    BytesPerLine = 400
+
+    def __init__(self, version, seed, layout, document, info_document, info_lines):
+        self.version = version
+        self.seed = seed
+        self.layout = layout
+        self.document = document
+        self.info_document = info_document
+        self.info_lines = info_lines
+
+    def release(self):
+        if self.document is not None:
+            self.document.deleteLater()
+            self.info_document.deleteLater()
+
+    def size(self):
+        size = len(self.layout.lines) * PageEntry.BytesPerLine
+        if self.document is not None:
+            size += (self.document.characterCount() + self.info_document.characterCount()) * PageEntry.BytesPerChar
+        return size
+
+
+class PageCache:
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.total_bytes = 0
+
+    def lookup(self, root, settings):
+        key = (root, settings.key())
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def store(self, root, settings, entry):
+        key = (root, settings.key())
+        if self.entries.get(key) is not entry:
+            self.discard(key)
+            self.entries[key] = entry
+        self.entries.move_to_end(key)
+        self.total_bytes += entry.size() - self.sizes.get(key, 0)
+        self.sizes[key] = entry.size()
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            self.discard(next(iter(self.entries)))
+
+    def discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= self.sizes.pop(key)
+            entry.release()
+
+    def clear(self):
+        for entry in self.entries.values():
+            entry.release()
+        self.entries.clear()
+        self.sizes.clear()
+        self.total_bytes = 0
+
+
+class LayoutScheduler:
+    Debounce = 120
+    SliceTime = 0.015
+
+    def __init__(self, main_doc):
+        self.main_doc = main_doc
+        self.timer = QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(LayoutScheduler.Debounce)
+        self.timer.timeout.connect(self.relayout)
+        self.generation = 0
+        self.layout = None
+        self.version = None
+        self.requested_at = None
+        self.last_latency = None
+
+    def request(self):
+        if self.requested_at is None:
+            self.requested_at = time.perf_counter()
+        self.generation += 1
+        self.layout = None
+        self.timer.start()
+
+    def cancel(self):
+        self.timer.stop()
+        self.generation += 1
+        self.layout = None
+        self.requested_at = None
+
+    def pending(self):
+        return self.requested_at is not None
+
+    def relayout(self):
+        main_doc = self.main_doc
+        root = main_doc.page.post
+        settings = main_doc.view.vis_settings.layoutSettings()
+        entry = main_doc.page_cache.lookup(root, settings)
+        if entry is not None and entry.version == main_doc.model.version:
+            self.apply(entry)
+            return
+        settings.seed = random.getrandbits(32) if entry is None else entry.seed
+        self.generation += 1
+        self.layout = PageLayout(root, settings).start()
+        self.version = main_doc.model.version
+        generation = self.generation
+        QTimer.singleShot(0, lambda: self.step(generation))
+
+    def step(self, generation):
+        if generation != self.generation or self.layout is None:
+            return
+        if self.version != self.main_doc.model.version:
+            self.relayout()
+            return
+        with instruments.span("layout"):
+            if not self.layout.advance(LayoutScheduler.SliceTime):
+                QTimer.singleShot(0, lambda: self.step(generation))
+                return
+            layout = self.layout.finish()
+        self.apply(self.main_doc.storeLayout(layout))
+
+    def apply(self, entry):
+        main_doc = self.main_doc
+        with instruments.operation("relayout"):
+            trace = main_doc.selectionTrace() if main_doc.sel_valid() else None
+            main_doc.showEntry(entry, trace)
+            self.last_latency = time.perf_counter() - self.requested_at
+            self.layout = None
+            self.requested_at = None
+            main_doc.view.statusBar().showMessage("Layout: " + str(int(self.last_latency * 1000)) + " ms")
+            instruments.add_time("latency", self.last_latency)
+
+
+class MainDoc(QTextEdit):
+
+    Tab = ":     "
+    DefaultFormat = QTextCharFormat()
+    CanonFormat = QTextCharFormat()
+    #CanonFormat.setFontUnderline(True)
+    SuppressFormat = QTextCharFormat()
+    #SuppressFormat.setFontStrikeOut(True)
+    AboveFormat = QTextCharFormat()
+    #AboveFormat.setForeground(QBrush(QColor(160, 160, 160), Qt.SolidPattern))
+    AboveLineFormat = QTextCharFormat(DefaultFormat)
+    AboveLineFormat.merge(AboveFormat)
+    AuthorFormat = QTextCharFormat()
+    AuthorFormat.setBackground(QBrush(QColor(255, 236, 150), Qt.SolidPattern))
+    AuthorLineFormat = QTextCharFormat(DefaultFormat)
+    AuthorLineFormat.merge(AuthorFormat)
+    AboveAuthorLineFormat = QTextCharFormat(AboveLineFormat)
+    AboveAuthorLineFormat.merge(AuthorFormat)
+
+    def __init__(self, model, view):
+        super(QTextEdit, self).__init__()
+
+        self.setReadOnly(True)
+        self.model = model
+        self.view = view
+        self.read_only = False
+
+        self.linear_list = []
+        self.sel_line = 0
+
+        self.back_stack = []
+        self.back_pointer = 0
+
+        self.page = None
+        self.entry = None
+        self.page_cache = PageCache()
+        self.layout_scheduler = LayoutScheduler(self)
+        self.virtual = False
+        self.blank_document = QTextDocument(self)
+        self.loadPage(self.model.time_ordered[0], new_doc=True)
+
+        self.cursorPositionChanged.connect(self.cursorMoved)
+
+        self.view.vis_settings.show_ellipses.stateChanged.connect(self.layout_scheduler.request)
+        self.view.vis_settings.collapse_repeats.stateChanged.connect(self.layout_scheduler.request)
+        self.view.vis_settings.separate_formality.stateChanged.connect(self.layout_scheduler.request)
+        self.view.vis_settings.direction_bias.valueChanged.connect(self.layout_scheduler.request)
+        self.view.vis_settings.depth_threshold.valueChanged.connect(self.layout_scheduler.request)
+        self.view.vis_settings.sorting_method.currentTextChanged.connect(self.layout_scheduler.request)
+        self.view.vis_settings.filter_authors.editingFinished.connect(self.layout_scheduler.request)
+        self.view.vis_settings.author_filter.currentTextChanged.connect(self.layout_scheduler.request)
+        self.view.vis_settings.time_window.currentTextChanged.connect(self.layout_scheduler.request)
+
+        self.verticalScrollBar().valueChanged.connect(self.view.info_doc.verticalScrollBar().setValue)
+
+    def cursorMoved(self):
+        if not self.virtual:
+            self.setSelectLine(self.textCursor().blockNumber())
+
+    def setSelectLine(self, pos):
+        self.sel_line = pos
+
+    def setVirtual(self, virtual):
+        self.virtual = virtual
+        self.page_cache.clear()
+        if virtual:
+            self.setDocument(self.blank_document)
+            self.view.info_doc.show_lines(self.view.info_doc.blank_document, [])
+        else:
+            self.view.page_view.showLines([])
+        self.loadPage(self.page.post)
+
+    def selectionTrace(self):
+        trace = []
+        curr = self.linear_list[self.sel_line][1]
+        while curr.heading is not None:
+            trace.append((curr.post, curr.kind))
+            curr = curr.heading
+        return trace
+
+    def restoreSelection(self, trace):
+        curr = None
+        next_curr = self.page
+        while len(trace) > 0 and next_curr is not None:
+            curr = next_curr
+            step = trace.pop()
+            next_curr = curr.get_by_kind(step[1], step[0])
+        if next_curr is not None:
+            curr = next_curr
+        self.moveSelector(curr.line_num)
+
+    def loadPage(self, root, new_doc=False, add_to_stack=False):
+        with instruments.operation("loadPage"):
+            trace = None
+            if self.page is not None and self.page.post == root and self.sel_valid():
+                trace = self.selectionTrace()
+
+            if new_doc:
+                self.page_cache.clear()
+                self.back_stack = [root]
+                self.back_pointer = 0
+            elif add_to_stack:
+                self.back_stack = self.back_stack[:self.back_pointer+1]
+                self.back_stack.append(root)
+                if len(self.back_stack) > 20:
+                    self.back_stack.pop(0)
+                else:
+                    self.back_pointer += 1
+
+            self.layout_scheduler.cancel()
+            settings = self.view.vis_settings.layoutSettings()
+            entry = self.page_cache.lookup(root, settings)
+            if entry is None or entry.version != self.model.version:
+                settings.seed = random.getrandbits(32) if entry is None else entry.seed
+                with instruments.span("layout"):
+                    layout = PageLayout(root, settings).compute()
+                entry = self.storeLayout(layout)
+            self.showEntry(entry, trace)
+
+    def storeLayout(self, layout):
+        if self.virtual:
+            entry = PageEntry(self.model.version, layout.settings.seed, layout, None, None, None)
+        else:
+            with instruments.span("info"):
+                info_document, info_lines = self.view.info_doc.render_lines(layout.lines)
+            with instruments.span("render"):
+                document = self.renderPage(layout)
+            entry = PageEntry(self.model.version, layout.settings.seed, layout, document, info_document, info_lines)
+        self.page_cache.store(layout.root, layout.settings, entry)
+        return entry
+
+    def showEntry(self, entry, trace):
+        self.entry = entry
+        self.page = entry.layout.page
+        self.linear_list = entry.layout.lines
+        new_line = self.page.line_num
+
+        if self.virtual:
+            self.view.page_view.showLines(self.linear_list)
+        else:
+            self.setDocument(entry.document)
+            self.view.info_doc.show_lines(entry.info_document, entry.info_lines)
+            cursor = self.textCursor()
+            cursor.movePosition(QTextCursor.End)
+            self.setTextCursor(cursor)
+
+        if trace is None:
+            self.moveSelector(new_line)
+        else:
+            self.restoreSelection(trace)
+
+    def affectedBy(self, post):
+        if post.auxiliary != Post.Neutral:
+            return True
+        for related in (post, post.parent, post.destination):
+            if related is not None and related in self.entry.layout.repeats:
+                return True
+        return False
+
+    def updatePage(self, post):
+        if not self.affectedBy(post):
+            return
+
+        with instruments.operation("updatePage"):
+            trace = self.selectionTrace() if self.sel_valid() else None
+            old_lines = self.linear_list
+            settings = self.entry.layout.settings
+            with instruments.span("layout"):
+                layout = PageLayout(self.page.post, settings).compute()
+            self.page = layout.page
+            self.linear_list = layout.lines
+
+            start, old_end, new_end = MainDoc.changedRange([MainDoc.lineKey(l) for l in old_lines],
+                                                           [MainDoc.lineKey(l) for l in self.linear_list])
+            if self.virtual:
+                self.view.page_view.patchLines(self.linear_list, start, old_end, new_end)
+            else:
+                with instruments.span("render"):
+                    if start < old_end or start < new_end:
+                        inserter = self.removeBlocks(start, old_end)
+                        self.writeLines(inserter, self.linear_list[start:new_end])
+                with instruments.span("info"):
+                    self.view.info_doc.update_text_to(self.linear_list)
+                self.entry.info_lines = self.view.info_doc.lines
+            self.entry.version = self.model.version
+            self.entry.layout = layout
+            self.page_cache.store(self.page.post, settings, self.entry)
+
+            if trace is None:
+                self.moveSelector(self.page.line_num)
+            else:
+                self.restoreSelection(trace)
+
+    @staticmethod
+    def lineKey(line):
+        return line if isinstance(line, int) else (line[0], line[2], line[3])
+
+    @staticmethod
+    def changedRange(old, new):
+        start = 0
+        while start < len(old) and start < len(new) and old[start] == new[start]:
+            start += 1
+        old_end = len(old)
+        new_end = len(new)
+        while old_end > start and new_end > start and old[old_end - 1] == new[new_end - 1]:
+            old_end -= 1
+            new_end -= 1
+        return start, old_end, new_end
+
+    def renderPage(self, layout):
+        document = QTextDocument(self)
+        document.setDefaultFont(self.font())
+        document.setUndoRedoEnabled(False)
+        self.writeLines(QTextCursor(document), layout.lines)
+        return document
+
+    def removeBlocks(self, start, end):
+        cursor = QTextCursor(self.document().findBlockByNumber(start))
+        cursor.setPosition(self.document().findBlockByNumber(end).position(), QTextCursor.KeepAnchor)
+        cursor.removeSelectedText()
+        return cursor
+
+    def writeLines(self, inserter, lines):
+        instruments.count("lines written", len(lines))
+        run_format = MainDoc.DefaultFormat
+        run = []
+        for line in lines:
+            if isinstance(line, int):
+                segments = ((MainDoc.DefaultFormat, MainDoc.Tab * line + "\n"),)
+            else:
+                segments = ((MainDoc.DefaultFormat, MainDoc.Tab * line[0]),
+                            (self.lineFormat(line[1], line[3]), line[2] + "\n"))
+            for char_format, text in segments:
+                if not text:
+                    continue
+                if char_format is not run_format and char_format != run_format:
+                    MainDoc.writeRun(inserter, run_format, run)
+                    run_format = char_format
+                    run = []
+                run.append(text)
+        MainDoc.writeRun(inserter, run_format, run)
+
+    @staticmethod
+    def writeRun(inserter, char_format, run):
+        if run:
+            inserter.setCharFormat(char_format)
+            inserter.insertText("".join(run))
+
+    def lineFormat(self, tree, above):
+        char_format = MainDoc.DefaultFormat
+        # formality = tree.post.formality()
+        # if formality == Post.Canon:
+        #     char_format = MainDoc.CanonFormat
+        # elif formality == Post.Suppress:
+        #     char_format = MainDoc.SuppressFormat
+
+        if above:
+            char_format = MainDoc.AboveAuthorLineFormat if tree.highlight else MainDoc.AboveLineFormat
+        elif tree.highlight:
+            char_format = MainDoc.AuthorLineFormat
+        return char_format
+
     def sel_valid(self):
         return self.sel_line < len(self.linear_list) and not isinstance(self.linear_list[self.sel_line], int)
 
     def keyPressEvent(self, e):
+        if not self.navigate(e):
+            QTextEdit.keyPressEvent(self, e)
+
+    def navigate(self, e):
+        navigation = self.entry.layout.navigation
         if e.key() == Qt.Key_Up:
             if e.modifiers() & Qt.ShiftModifier and self.sel_valid():
-                line = self.searchForLines(self.sel_line, -1, self.linear_list[self.sel_line][0], True)
-                self.moveSelector(line)
+                self.moveSelector(int(navigation.same_above[self.sel_line]))
             elif self.sel_line > 0:
-                line = self.sel_line - 1
-                while isinstance(self.linear_list[line], int):
-                    line -= 1
-                self.moveSelector(line)
+                self.moveSelector(int(navigation.above[self.sel_line]))
         elif e.key() == Qt.Key_Down:
             if e.modifiers() & Qt.ShiftModifier and self.sel_valid():
-                line = self.searchForLines(self.sel_line, 1, self.linear_list[self.sel_line][0], True)
-                self.moveSelector(line)
+                self.moveSelector(int(navigation.same_below[self.sel_line]))
             elif self.sel_line < len(self.linear_list) - 1:
-                line = self.sel_line + 1
-                while isinstance(self.linear_list[line], int):
-                    line += 1
-                self.moveSelector(line)
+                self.moveSelector(int(navigation.below[self.sel_line]))
         elif e.key() == Qt.Key_Left:
             if not self.sel_valid():
-                return
+                return True
             kind = self.linear_list[self.sel_line][1].kind
+            line = -1
             if kind == LinearTree.Parent or kind == LinearTree.Source:
-                line = self.searchForLines(self.sel_line, 1, self.linear_list[self.sel_line][0] - 1, False)
-                if line >= 0:
-                    self.moveSelector(line)
+                line = int(navigation.outer_below[self.sel_line])
             elif kind == LinearTree.Destination or kind == LinearTree.Child:
-                line = self.searchForLines(self.sel_line, -1, self.linear_list[self.sel_line][0] - 1, False)
-                if line >= 0:
-                    self.moveSelector(line)
+                line = int(navigation.outer_above[self.sel_line])
+            if line >= 0:
+                self.moveSelector(line)
         elif e.key() == Qt.Key_Right:
             if not self.sel_valid():
-                return
+                return True
             if e.modifiers() & Qt.ShiftModifier:
-                line = self.searchForLines(self.sel_line, -1, self.linear_list[self.sel_line][0] + 1, False)
-                if line >= 0:
-                    self.moveSelector(line)
+                line = int(navigation.inner_above[self.sel_line])
             else:
-                line = self.searchForLines(self.sel_line, 1, self.linear_list[self.sel_line][0] + 1, False)
-                if line >= 0:
-                    self.moveSelector(line)
+                line = int(navigation.inner_below[self.sel_line])
+            if line >= 0:
+                self.moveSelector(line)
         elif e.key() == Qt.Key_Space:
             if not self.sel_valid():
-                return
+                return True
             add_stack = self.page.post != self.linear_list[self.sel_line][1].post
             self.loadPage(self.linear_list[self.sel_line][1].post, add_to_stack=add_stack)
         elif e.key() == Qt.Key_Return:
             if not self.sel_valid():
-                return
+                return True
             if e.modifiers() & Qt.ShiftModifier:
                 if self.view.write_box.destination_post != self.linear_list[self.sel_line][1].post:
                     self.view.write_box.setDestination(self.linear_list[self.sel_line][1].post)
@@ -787,39 +1499,24 @@ class MainDoc(QTextEdit):
                         self.back_pointer -= 1
                         self.loadPage(self.back_stack[self.back_pointer])
         elif e.key() == Qt.Key_Plus or e.key() == Qt.Key_Equal:
-            if self.sel_valid() and self.linear_list[self.sel_line][1].kind == LinearTree.Child:
-                self.linear_list[self.sel_line][1].post.addScore(1)
-                self.loadPage(self.page.post)
+            if self.sel_valid() and self.linear_list[self.sel_line][1].kind == LinearTree.Child and not self.read_only:
+                self.model.add_score(self.linear_list[self.sel_line][1].post, 1)
+                self.updatePage(self.linear_list[self.sel_line][1].post)
                 self.view.change_made()
         elif e.key() == Qt.Key_Minus:
-            if self.sel_valid() and self.linear_list[self.sel_line][1].kind == LinearTree.Child:
-                self.linear_list[self.sel_line][1].post.addScore(-1)
-                self.loadPage(self.page.post)
+            if self.sel_valid() and self.linear_list[self.sel_line][1].kind == LinearTree.Child and not self.read_only:
+                self.model.add_score(self.linear_list[self.sel_line][1].post, -1)
+                self.updatePage(self.linear_list[self.sel_line][1].post)
                 self.view.change_made()
         else:
-            QTextEdit.keyPressEvent(self, e)
-
-    def searchForLines(self, start_line, step, tabs, settle_for_end):
-        new_line = start_line + step
-        while 0 <= new_line < len(self.linear_list) and (isinstance(self.linear_list[new_line], int) or
-                                                         self.linear_list[new_line][0] >= tabs):
-            if not isinstance(self.linear_list[new_line], int) and self.linear_list[new_line][0] == tabs:
-                return new_line
-            new_line += step
-        if settle_for_end:
-            if new_line >= len(self.linear_list):
-                new_line = len(self.linear_list) - 1
-            elif new_line < 0:
-                new_line = 0
-            return new_line
-        return -1
+            return False
+        return True
 
     def moveSelector(self, new_line):
-        cursor = self.textCursor()
-        # cursor.movePosition(QTextCursor.StartOfBlock, QTextCursor.MoveAnchor)
-        cursor.movePosition(QTextCursor.PreviousBlock, QTextCursor.MoveAnchor, n=self.textCursor().blockNumber() - new_line)
-        cursor.movePosition(QTextCursor.NextBlock, QTextCursor.MoveAnchor, n=new_line - self.textCursor().blockNumber())
-        cursor.movePosition(QTextCursor.StartOfBlock, QTextCursor.MoveAnchor)
+        if self.virtual:
+            self.view.page_view.selectLine(new_line)
+            return
+        cursor = QTextCursor(self.document().findBlockByNumber(new_line))
         cursor.movePosition(QTextCursor.EndOfBlock, QTextCursor.KeepAnchor)
 
         self.setTextCursor(cursor)
@@ -837,34 +1534,49 @@ class InfoDoc(QTextEdit):
         self.setFixedWidth(120)
         self.setLineWrapMode(QTextEdit.NoWrap)
         self.setEnabled(False)
+        self.lines = []
+        self.blank_document = QTextDocument(self)
+
+    def info_line(self, l, dates=None):
+        line = " "
+        if not isinstance(l, int):
+            tree = l[1]
+            line += tree.post.author
+            timestamp = tree.post.timestamp
+            if timestamp is not None:
+                if line != " ":
+                    line += ", "
+                line += (dates or DateLabels()).label(timestamp)
+
+            if tree.kind == LinearTree.Child and tree.post.score != 0:
+                line += " | " + str(tree.post.score)
+        return line
 
     def sync_text_to(self, lines):
-        self.setText("")
-        for i, l in enumerate(lines):
-            line = " "
-            if not isinstance(l, int):
-                tree = l[1]
-                line += tree.post.author
-                if tree.post.timestamp is not None:
-                    if line != " ":
-                        line += ", "
-
-                    curr_time = QDateTime.currentDateTime()
-                    last_time = tree.post.timestamp
-                    if curr_time.date().year() == last_time.date().year():
-                        if curr_time.date().month() == last_time.date().month() and \
-                           curr_time.date().day() == last_time.date().day():
-                            line += last_time.toString("hh:mm")
-                        else:
-                            line += last_time.toString("MM/dd")
-                    else:
-                        line += last_time.toString("MM/yyyy")
-
-                if tree.kind == LinearTree.Child and tree.post.score != 0:
-                    line += " | " + str(tree.post.score)
-
-            self.append(line)
-        self.append("\n")
+        self.show_lines(*self.render_lines(lines))
+
+    def render_lines(self, lines):
+        dates = DateLabels()
+        texts = [self.info_line(l, dates) for l in lines]
+        document = QTextDocument(self)
+        document.setDefaultFont(self.font())
+        document.setUndoRedoEnabled(False)
+        QTextCursor(document).insertText("\n".join(texts) + "\n\n")
+        return document, texts
+
+    def show_lines(self, document, texts):
+        self.setDocument(document)
+        self.lines = texts
+
+    def update_text_to(self, lines):
+        dates = DateLabels()
+        new_lines = [self.info_line(l, dates) for l in lines]
+        start, old_end, new_end = MainDoc.changedRange(self.lines, new_lines)
+        if start < old_end or start < new_end:
+            cursor = QTextCursor(self.document().findBlockByNumber(start))
+            cursor.setPosition(self.document().findBlockByNumber(old_end).position(), QTextCursor.KeepAnchor)
+            cursor.insertText("".join(line + "\n" for line in new_lines[start:new_end]))
+        self.lines = new_lines
 
     def keyPressEvent(self, e):
         if e.key() != Qt.Key_Up and e.key() != Qt.Key_Down and e.key() != Qt.Key_PageUp and e.key() != Qt.Key_PageDown\
@@ -872,6 +1584,121 @@ class InfoDoc(QTextEdit):
             QTextEdit.keyPressEvent(self, e)
 
 
+class DateLabels:
+
+    def __init__(self):
+        now = time.localtime()
+        self.year = now.tm_year
+        self.day = (now.tm_mon, now.tm_mday)
+        self.labels = {}
+
+    def label(self, timestamp):
+        text = self.labels.get(timestamp)
+        if text is None:
+            when = time.localtime(timestamp)
+            if when.tm_year != self.year:
+                text = time.strftime("%m/%Y", when)
+            elif (when.tm_mon, when.tm_mday) == self.day:
+                text = time.strftime("%H:%M", when)
+            else:
+                text = time.strftime("%m/%d", when)
+            self.labels[timestamp] = text
+        return text
+
+
+class PageModel(QAbstractTableModel):
+    InfoColumn = 0
+    LineColumn = 1
+
+    def __init__(self, view):
+        super(QAbstractTableModel, self).__init__()
+        self.view = view
+        self.lines = []
+        self.dates = DateLabels()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.lines)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 2
+
+    def data(self, index, role=Qt.DisplayRole):
+        line = self.lines[index.row()]
+        if role == Qt.DisplayRole:
+            if index.column() == PageModel.InfoColumn:
+                return self.view.info_doc.info_line(line, self.dates)
+            if isinstance(line, int):
+                return MainDoc.Tab * line
+            return MainDoc.Tab * line[0] + line[2]
+        if index.column() == PageModel.InfoColumn or isinstance(line, int):
+            return None
+        char_format = self.view.main_doc.lineFormat(line[1], line[3])
+        if role == Qt.ForegroundRole and char_format.hasProperty(QTextFormat.ForegroundBrush):
+            return char_format.foreground()
+        if role == Qt.BackgroundRole and char_format.hasProperty(QTextFormat.BackgroundBrush):
+            return char_format.background()
+        if role == Qt.FontRole and char_format.propertyCount() > 0:
+            return char_format.font().resolve(self.view.page_view.font())
+        return None
+
+    def setLines(self, lines):
+        self.beginResetModel()
+        self.lines = lines
+        self.dates = DateLabels()
+        self.endResetModel()
+
+    def patchLines(self, lines, start, old_end, new_end):
+        self.dates = DateLabels()
+        if start < old_end:
+            self.beginRemoveRows(QModelIndex(), start, old_end - 1)
+            self.lines = lines[:start] + lines[new_end:]
+            self.endRemoveRows()
+        if start < new_end:
+            self.beginInsertRows(QModelIndex(), start, new_end - 1)
+            self.lines = lines
+            self.endInsertRows()
+        self.lines = lines
+        if len(lines) > 0:
+            self.dataChanged.emit(self.index(0, PageModel.InfoColumn), self.index(len(lines) - 1, PageModel.InfoColumn))
+
+
+class PageView(QTreeView):
+    def __init__(self, view):
+        super(QTreeView, self).__init__()
+
+        self.view = view
+        self.page_model = PageModel(view)
+        self.setModel(self.page_model)
+        self.setHeaderHidden(True)
+        self.setRootIsDecorated(False)
+        self.setItemsExpandable(False)
+        self.setUniformRowHeights(True)
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.setTextElideMode(Qt.ElideRight)
+        self.header().setStretchLastSection(True)
+        self.header().setSectionResizeMode(PageModel.InfoColumn, QHeaderView.Fixed)
+        self.header().resizeSection(PageModel.InfoColumn, 120)
+        self.selectionModel().currentRowChanged.connect(lambda current: self.view.main_doc.setSelectLine(current.row()))
+
+    def showLines(self, lines):
+        self.page_model.setLines(lines)
+
+    def patchLines(self, lines, start, old_end, new_end):
+        self.page_model.patchLines(lines, start, old_end, new_end)
+
+    def selectLine(self, line):
+        index = self.page_model.index(line, PageModel.LineColumn)
+        self.setCurrentIndex(index)
+        self.scrollTo(index)
+        self.view.main_doc.setSelectLine(line)
+
+    def keyPressEvent(self, e):
+        if not self.view.main_doc.navigate(e):
+            QTreeView.keyPressEvent(self, e)
+
+
 class App(QApplication):
 
     def __init__(self, argv):
@@ -0,0 +1,1180 @@
+import gzip
+import io
+import lzma
+import os
+import re
+import shutil
+import struct
+import sys
+import time
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from itertools import accumulate
+
+from instrumentation import instruments
+
+
+class Post:
+    __slots__ = ("store", "row")
+
+    Suppress = -1
+    Neutral = 0
+    Canon = 1
+
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
+
+    def __eq__(self, other):
+        return isinstance(other, Post) and self.row == other.row and self.store is other.store
+
+    def __hash__(self):
+        return self.row
+
+    @property
+    def ident(self):
+        return self.store.ident[self.row]
+
+    @property
+    def text(self):
+        return self.store.texts[self.row]
+
+    @property
+    def author(self):
+        return self.store.author_names[self.store.author[self.row]]
+
+    @property
+    def timestamp(self):
+        epoch = self.store.timestamp[self.row]
+        return None if epoch == PostStore.NoTime else epoch
+
+    @property
+    def parent(self):
+        row = int(self.store.parent[self.row])
+        return None if row < 0 else Post(self.store, row)
+
+    @property
+    def destination(self):
+        row = int(self.store.destination[self.row])
+        return None if row < 0 else Post(self.store, row)
+
+    @property
+    def children(self):
+        return [Post(self.store, row) for row in self.store.children_of(self.row).tolist()]
+
+    @property
+    def sources(self):
+        return [Post(self.store, row) for row in self.store.sources_of(self.row).tolist()]
+
+    @property
+    def score(self):
+        return int(self.store.score[self.row])
+
+    @property
+    def score_vis(self):
+        self.store.refresh_stale()
+        return float(self.store.score_vis[self.row])
+
+    @property
+    def auxiliary(self):
+        return int(self.store.auxiliary[self.row])
+
+    @property
+    def canon_score(self):
+        return int(self.store.canon_score[self.row])
+
+    @property
+    def suppress_score(self):
+        return int(self.store.suppress_score[self.row])
+
+    def addScore(self, amt):
+        self.store.score[self.row] += amt
+        self.store.mark_stale(self.row)
+
+    @staticmethod
+    def visFromScore(score):
+        import numpy
+        return 1 / (1 + numpy.exp(-0.5 * score))
+
+    @staticmethod
+    def formalityFromScores(canon_score, suppress_score):
+        diff = (canon_score > 0) - (canon_score < 0) - (suppress_score > 0) + (suppress_score < 0)
+        return (diff > 0) - (diff < 0)
+
+    def formality(self):
+        self.store.refresh_stale()
+        return int(self.store.formality[self.row])
+
+
+class PostStore:
+    NoTime = -2**63
+
+    Columns = [("ident", "q"), ("parent", "i"), ("destination", "i"), ("score", "q"), ("score_vis", "d"),
+               ("auxiliary", "b"), ("canon_score", "i"), ("suppress_score", "i"), ("formality", "b"),
+               ("timestamp", "q"), ("author", "i")]
+    SavedColumns = ["ident", "parent", "destination", "score", "auxiliary", "timestamp", "author"]
+
+    def __init__(self):
+        self.count = 0
+        for name, typecode in PostStore.Columns:
+            setattr(self, name, array(typecode))
+        self.texts = []
+        self.author_names = []
+        self.author_ids = {}
+        self.author_rows = []
+        self.ident_rows = None
+
+        self.fresh_count = 0
+        self.stale = set()
+        self.defer_formality = False
+
+        self.linked_count = 0
+        self.links_dirty = True
+        self.child_offsets = None
+        self.child_index = None
+        self.source_offsets = None
+        self.source_index = None
+        self.extra_children = {}
+        self.extra_sources = {}
+
+        self.time_count = 0
+        self.time_keys = array("q")
+        self.time_rows = array("i")
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [Post(self, row) for row in range(*key.indices(self.count))]
+        if key < 0:
+            key += self.count
+        if not 0 <= key < self.count:
+            raise IndexError("post row out of range")
+        return Post(self, key)
+
+    def __iter__(self):
+        for row in range(self.count):
+            yield Post(self, row)
+
+    def column(self, name):
+        import numpy
+        values = getattr(self, name)
+        return numpy.frombuffer(values, dtype=values.typecode) if len(values) > 0 else numpy.empty(0, values.typecode)
+
+    def snapshot(self):
+        snapshot = PostStore()
+        snapshot.count = self.count
+        for name in PostStore.SavedColumns:
+            setattr(snapshot, name, getattr(self, name)[:self.count])
+        snapshot.texts = self.texts[:self.count]
+        snapshot.author_names = self.author_names[:]
+        return snapshot
+
+    def intern_author(self, name):
+        author_id = self.author_ids.get(name)
+        if author_id is None:
+            author_id = len(self.author_names)
+            self.author_ids[name] = author_id
+            self.author_names.append(name)
+            self.author_rows.append(array("i"))
+        return author_id
+
+    def rows_by_author(self, name):
+        author_id = self.author_ids.get(name)
+        return self.author_rows[author_id] if author_id is not None else array("i")
+
+    def find(self, ident):
+        if 0 <= ident < self.count and self.ident[ident] == ident:
+            return ident
+        if self.ident_rows is None:
+            self.ident_rows = {value: row for row, value in enumerate(self.ident)}
+        row = self.ident_rows.get(ident)
+        if row is None:
+            raise KeyError(ident)
+        return row
+
+    def append(self, ident, parent, destination, text, score, auxiliary, author, timestamp):
+        row = self.count
+        counted = parent >= 0 and auxiliary != Post.Neutral
+        self.ident.append(ident)
+        self.parent.append(parent)
+        self.destination.append(destination)
+        self.score.append(score)
+        self.score_vis.append(0.0)
+        self.auxiliary.append(auxiliary)
+        self.canon_score.append(0)
+        self.suppress_score.append(-1 if counted else 0)
+        self.formality.append(0)
+        self.timestamp.append(PostStore.NoTime if timestamp is None else timestamp)
+        author_id = self.intern_author(author)
+        self.author.append(author_id)
+        self.author_rows[author_id].append(row)
+        self.texts.append(text)
+        if self.ident_rows is not None:
+            self.ident_rows[ident] = row
+        self.count += 1
+
+        self.link_new_rows(row)
+        if counted and not self.defer_formality:
+            self.propagate_formality(row)
+        return row
+
+    def extend_columns(self, columns, start, stop):
+        import numpy
+        size = stop - start
+        if size <= 0:
+            return
+        first = self.count
+        for name in ("ident", "parent", "destination", "score", "auxiliary", "timestamp"):
+            getattr(self, name).extend(columns[name][start:stop])
+        self.score_vis.frombytes(bytes(8 * size))
+        self.canon_score.frombytes(bytes(4 * size))
+        self.formality.frombytes(bytes(size))
+        if self.ident_rows is not None:
+            self.ident_rows.update(zip(columns["ident"][start:stop], range(first, first + size)))
+
+        text_offsets = columns["text_offsets"]
+        text_blob = columns["text_blob"]
+        self.texts.extend(map(bytes.decode, map(text_blob.__getitem__, map(slice, text_offsets[start:stop],
+                                                                           text_offsets[start + 1:stop + 1]))))
+        author_ids = columns.get("author_ids")
+        if author_ids is None:
+            author_ids = columns["author_ids"] = array("i", map(self.intern_author, columns["author_names"]))
+        authors = columns["author"][start:stop]
+        if author_ids != array("i", range(len(author_ids))):
+            authors = array("i", map(author_ids.__getitem__, authors))
+        self.author.extend(authors)
+        by_author = numpy.frombuffer(authors, dtype=numpy.int32)
+        order = (numpy.argsort(by_author, kind="stable") + first).astype(numpy.int32)
+        begin = 0
+        for author_id, end in enumerate(numpy.cumsum(numpy.bincount(by_author)).tolist()):
+            if end > begin:
+                self.author_rows[author_id].frombytes(order[begin:end].tobytes())
+            begin = end
+
+        counted = (numpy.frombuffer(columns["auxiliary"][start:stop], dtype=numpy.int8) != Post.Neutral) & \
+                  (numpy.frombuffer(columns["parent"][start:stop], dtype=numpy.int32) >= 0)
+        self.suppress_score.frombytes(numpy.where(counted, -1, 0).astype(numpy.int32).tobytes())
+        aux_rows = (numpy.flatnonzero(counted) + first).tolist()
+        self.count += size
+        self.link_new_rows(first)
+
+        if not self.defer_formality:
+            for row in aux_rows:
+                self.propagate_formality(row)
+
+    def propagate_formality(self, row):
+        upgrade = True
+        parent = self.parent[row]
+        while parent >= 0:
+            canon_score = self.canon_score[parent]
+            suppress_score = self.suppress_score[parent]
+            pre_type = Post.formalityFromScores(canon_score, suppress_score)
+            amt = 1 if upgrade else -1
+            if self.auxiliary[row] == Post.Canon:
+                canon_score += amt
+                self.canon_score[parent] = canon_score
+            else:
+                suppress_score += amt
+                self.suppress_score[parent] = suppress_score
+            self.mark_stale(parent)
+
+            post_type = Post.formalityFromScores(canon_score, suppress_score)
+            if self.auxiliary[parent] == Post.Neutral or (pre_type == Post.Canon) == (post_type == Post.Canon):
+                break
+            upgrade = post_type == Post.Canon
+            row = parent
+            parent = self.parent[row]
+
+    def resolve_formality(self):
+        import numpy
+        count = self.count
+        auxiliary = self.auxiliary
+        parents = self.parent
+        counted = numpy.flatnonzero((self.column("auxiliary") != Post.Neutral) & (self.column("parent") >= 0)).tolist()
+        canon = [0] * count
+        suppress = [0] * count
+        for row in counted:
+            suppress[row] = -1
+        for row in reversed(counted):
+            if Post.formalityFromScores(canon[row], suppress[row]) == Post.Canon:
+                if auxiliary[row] == Post.Canon:
+                    canon[parents[row]] += 1
+                else:
+                    suppress[parents[row]] += 1
+        self.canon_score = array(self.canon_score.typecode, canon)
+        self.suppress_score = array(self.suppress_score.typecode, suppress)
+        self.fresh_count = 0
+        self.stale = set()
+        self.defer_formality = False
+
+    def mark_stale(self, row):
+        if row < self.fresh_count:
+            self.stale.add(row)
+
+    def refresh(self, rows=None):
+        import numpy
+        if rows is None:
+            rows = slice(0, self.count)
+        score_vis = self.column("score_vis")
+        score_vis[rows] = Post.visFromScore(self.column("score")[rows])
+        formality = self.column("formality")
+        formality[rows] = numpy.sign(numpy.sign(self.column("canon_score")[rows]) -
+                                     numpy.sign(self.column("suppress_score")[rows]))
+
+    def refresh_stale(self):
+        if self.fresh_count < self.count:
+            self.refresh(slice(self.fresh_count, self.count))
+            self.fresh_count = self.count
+        if len(self.stale) > 0:
+            self.refresh(sorted(self.stale))
+            self.stale = set()
+
+    @staticmethod
+    def adjacency(targets, count):
+        import numpy
+        linked = targets >= 0
+        keys = targets[linked]
+        index = numpy.flatnonzero(linked).astype(numpy.int32)[numpy.argsort(keys, kind="stable")]
+        offsets = numpy.zeros(count + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(keys, minlength=count), out=offsets[1:])
+        return offsets, index
+
+    def link_rows(self):
+        self.child_offsets, self.child_index = PostStore.adjacency(self.column("parent"), self.count)
+        self.source_offsets, self.source_index = PostStore.adjacency(self.column("destination"), self.count)
+        self.linked_count = self.count
+        self.links_dirty = False
+        self.extra_children = {}
+        self.extra_sources = {}
+
+    def ensure_links(self):
+        if self.links_dirty:
+            self.link_rows()
+
+    def link_new_rows(self, first):
+        if self.links_dirty:
+            return
+        if self.count - self.linked_count > max(self.linked_count, 4096):
+            self.links_dirty = True
+            return
+        for row in range(first, self.count):
+            parent = self.parent[row]
+            if parent >= 0:
+                self.extra_children.setdefault(parent, []).append(row)
+            destination = self.destination[row]
+            if destination >= 0:
+                self.extra_sources.setdefault(destination, []).append(row)
+
+    def linked_rows(self, row, offsets, index, extra):
+        import numpy
+        rows = index[offsets[row]:offsets[row+1]] if row < self.linked_count else index[:0]
+        if row in extra:
+            rows = numpy.concatenate((rows, numpy.array(extra[row], dtype=index.dtype)))
+        return rows
+
+    def children_of(self, row):
+        self.ensure_links()
+        return self.linked_rows(row, self.child_offsets, self.child_index, self.extra_children)
+
+    def sources_of(self, row):
+        self.ensure_links()
+        return self.linked_rows(row, self.source_offsets, self.source_index, self.extra_sources)
+
+    def ensure_time_index(self):
+        if self.time_count == self.count:
+            return
+        import numpy
+        timestamps = self.column("timestamp")
+        added = timestamps[self.time_count:]
+        last = self.time_keys[-1] if len(self.time_keys) > 0 else PostStore.NoTime
+        if added[0] >= last and (added[1:] >= added[:-1]).all():
+            self.time_keys.frombytes(added.tobytes())
+            self.time_rows.extend(range(self.time_count, self.count))
+        else:
+            order = numpy.argsort(timestamps, kind="stable")
+            self.time_keys = array("q", timestamps[order].tobytes())
+            self.time_rows = array("i", order.astype(numpy.int32).tobytes())
+        self.time_count = self.count
+
+    def rows_between(self, start, stop=None):
+        self.ensure_time_index()
+        first = bisect_left(self.time_keys, max(start, PostStore.NoTime + 1))
+        last = len(self.time_keys) if stop is None else bisect_left(self.time_keys, stop)
+        return self.time_rows[first:last]
+
+    def nbytes(self):
+        self.ensure_links()
+        return sum(len(getattr(self, name)) * getattr(self, name).itemsize for name, typecode in PostStore.Columns) + \
+            self.child_offsets.nbytes + self.child_index.nbytes + self.source_offsets.nbytes + \
+            self.source_index.nbytes + sum(len(rows) * rows.itemsize for rows in self.author_rows)
+
+
+class SearchIndex:
+    Word = re.compile(r"\w+")
+    PrefixRatio = 4
+    LastChar = chr(0x10ffff)
+
+    magic = b"BUGI"
+    version = 1
+    header = struct.Struct("<4sIQQQQ")
+    suffix = ".index"
+
+    def __init__(self):
+        self.indexed_count = 0
+        self.tokens = []
+        self.offsets = array("q", [0])
+        self.postings = array("i")
+        self.extra = {}
+        self.extra_count = 0
+
+    @staticmethod
+    def tokenize(text):
+        return SearchIndex.Word.findall(text.lower())
+
+    def update(self, store):
+        extra = self.extra
+        texts = store.texts
+        for row in range(self.indexed_count, len(store)):
+            for token in set(SearchIndex.Word.findall(texts[row].lower())):
+                rows = extra.get(token)
+                if rows is None:
+                    extra[token] = rows = array("i")
+                rows.append(row)
+                self.extra_count += 1
+        self.indexed_count = max(self.indexed_count, len(store))
+
+    def compact(self):
+        if len(self.extra) == 0:
+            return
+        tokens = sorted(set(self.tokens).union(self.extra))
+        offsets = array("q", [0])
+        postings = array("i")
+        for token in tokens:
+            postings.extend(self.base_rows(token))
+            if token in self.extra:
+                postings.extend(self.extra[token])
+            offsets.append(len(postings))
+        self.tokens = tokens
+        self.offsets = offsets
+        self.postings = postings
+        self.extra = {}
+        self.extra_count = 0
+
+    def base_rows(self, token):
+        i = bisect_left(self.tokens, token)
+        if i < len(self.tokens) and self.tokens[i] == token:
+            return self.postings[self.offsets[i]:self.offsets[i+1]]
+        return array("i")
+
+    def rows(self, token):
+        rows = self.base_rows(token)
+        if token in self.extra:
+            rows = rows + self.extra[token]
+        return rows
+
+    def prefix_size(self, prefix):
+        first = bisect_left(self.tokens, prefix)
+        last = bisect_left(self.tokens, prefix + SearchIndex.LastChar)
+        return self.offsets[last] - self.offsets[first] + \
+            sum(len(rows) for token, rows in self.extra.items() if token.startswith(prefix))
+
+    def prefix_rows(self, prefix):
+        first = bisect_left(self.tokens, prefix)
+        last = bisect_left(self.tokens, prefix + SearchIndex.LastChar)
+        extra = [rows for token, rows in self.extra.items() if token.startswith(prefix)]
+        if last - first == 1 and len(extra) == 0:
+            return self.base_rows(self.tokens[first])
+        if last == first and len(extra) == 1:
+            return extra[0]
+        return sorted(set(self.postings[self.offsets[first]:self.offsets[last]]).union(*extra))
+
+    @staticmethod
+    def contains(rows, row):
+        i = bisect_left(rows, row)
+        return i < len(rows) and rows[i] == row
+
+    def search(self, store, query, limit=None):
+        tokens = SearchIndex.tokenize(query)
+        if len(tokens) == 0:
+            return []
+        prefix = None
+        if query[-1:].isalnum() or query.endswith("_"):
+            prefix = tokens.pop()
+        matches = sorted((self.rows(token) for token in set(tokens)), key=len)
+        if prefix is not None and (len(matches) == 0 or self.prefix_size(prefix) <=
+                                   SearchIndex.PrefixRatio * len(matches[0])):
+            matches = sorted(matches + [self.prefix_rows(prefix)], key=len)
+            prefix = None
+        found = []
+        for row in reversed(matches[0]):
+            if all(SearchIndex.contains(rows, row) for rows in matches[1:]) and \
+               (prefix is None or any(token.startswith(prefix) for token in SearchIndex.tokenize(store.texts[row]))):
+                found.append(row)
+                if limit is not None and len(found) >= limit:
+                    break
+        return found
+
+    @staticmethod
+    def stamp(path):
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def write(self, path):
+        self.compact()
+        size, mtime = SearchIndex.stamp(path)
+        blob = "\n".join(self.tokens).encode("utf-8")
+        with open(path + SearchIndex.suffix, 'wb') as file:
+            file.write(SearchIndex.header.pack(SearchIndex.magic, SearchIndex.version, self.indexed_count, size, mtime,
+                                               len(self.tokens)))
+            file.write(struct.pack("<Q", len(blob)))
+            file.write(blob)
+            file.write(Model.little_endian(self.offsets))
+            file.write(Model.little_endian(self.postings))
+
+    def read(self, path):
+        index_path = path + SearchIndex.suffix
+        if not os.path.exists(index_path):
+            return False
+        with open(index_path, 'rb') as file:
+            data = file.read()
+        if len(data) < SearchIndex.header.size + 8:
+            return False
+        magic, version, count, size, mtime, token_count = SearchIndex.header.unpack_from(data)
+        if magic != SearchIndex.magic or version != SearchIndex.version or (size, mtime) != SearchIndex.stamp(path):
+            return False
+        offset = SearchIndex.header.size
+        blob_size, = struct.unpack_from("<Q", data, offset)
+        offset += 8
+        tokens = data[offset:offset + blob_size].decode("utf-8").split("\n") if token_count > 0 else []
+        offset += blob_size
+        offsets = array("q")
+        offsets.frombytes(data[offset:offset + (token_count + 1) * offsets.itemsize])
+        offset += (token_count + 1) * offsets.itemsize
+        postings = array("i")
+        postings.frombytes(data[offset:])
+        if sys.byteorder != "little":
+            offsets.byteswap()
+            postings.byteswap()
+        if len(tokens) != token_count or len(offsets) != token_count + 1 or len(postings) != offsets[-1]:
+            return False
+        self.indexed_count = count
+        self.tokens = tokens
+        self.offsets = offsets
+        self.postings = postings
+        self.extra = {}
+        self.extra_count = 0
+        return True
+
+
+PostRecord = namedtuple("PostRecord", ["parent", "ident", "destination", "text", "score", "auxiliary", "author",
+                                       "timestamp"])
+
+
+class Model:
+    arrow = ">"
+    separator = "|"
+    empty = "_"
+
+    binary_magic = b"BUGC"
+    binary_version = 2
+    binary_header = struct.Struct("<4sIQ")
+    binary_extension = ".bugc"
+    binary_columns = {1: [("ident", "q", 0), ("parent", "q", 0), ("destination", "q", 0), ("score", "q", 0),
+                          ("timestamp", "q", 0), ("text_offsets", "Q", 1), ("author_offsets", "Q", 1),
+                          ("auxiliary", "b", 0)],
+                      2: [("ident", "q", 0), ("parent", "i", 0), ("destination", "i", 0), ("score", "q", 0),
+                          ("timestamp", "q", 0), ("author", "i", 0), ("text_offsets", "Q", 1), ("auxiliary", "b", 0),
+                          ("name_count", "Q", None)]}
+
+    journal_suffix = ".journal"
+    score_mark = "*"
+    journal_mark = "#"
+    journal_ratio = 0.25
+
+    compressed_magic = {".gz": b"\x1f\x8b", ".xz": b"\xfd7zXZ\x00"}
+    stream_errors = (EOFError, zlib.error, lzma.LZMAError)
+
+    def __init__(self, indexed=True):
+        self.store = PostStore()
+        self.time_ordered = self.store
+        self.indexed = indexed
+        self.search_index = SearchIndex()
+        self.index_count = 0
+        self.version = 0
+        self.score_deltas = {}
+        self.synced_path = None
+        self.synced_count = 0
+        self.base_bytes = 0
+        self.journal_bytes = 0
+
+    def clear(self):
+        self.store = PostStore()
+        self.time_ordered = self.store
+        self.search_index = SearchIndex()
+        self.index_count = 0
+        self.version += 1
+
+    @property
+    def authors(self):
+        return [name for name in self.store.author_names if name != ""]
+
+    def posts_by(self, author):
+        return [self.store[row] for row in self.store.rows_by_author(author)]
+
+    def posts_between(self, start, stop=None):
+        return [self.store[row] for row in self.store.rows_between(start, stop)]
+
+    def index_posts(self):
+        self.search_index.update(self.store)
+
+    def search(self, query, limit=None):
+        self.index_posts()
+        return [self.store[row] for row in self.search_index.search(self.store, query, limit)]
+
+    def add_score(self, post, amt):
+        post.addScore(amt)
+        self.score_deltas[post] = self.score_deltas.get(post, 0) + amt
+        self.version += 1
+
+    def add_post(self, parent, destination, text, score=0, auxiliary=Post.Neutral, author=""):
+        self.version += 1
+        row = self.store.append(len(self.store), parent.row if parent is not None else -1,
+                                destination.row if destination is not None else -1, text, score, auxiliary, author,
+                                int(time.time()))
+        if self.indexed:
+            self.index_posts()
+        return self.store[row]
+
+    def new_model(self, title, author=""):
+        self.clear()
+        self.store.append(0, -1, -1, title, 0, Post.Neutral, author, int(time.time()))
+        self.mark_synced(None)
+
+    def encode_post(self, post):
+        sep = self.separator
+        store = post.store
+        parent = store.parent[post.row]
+        destination = store.destination[post.row]
+        p = self.format_ident(store.ident[parent]) if parent >= 0 else self.empty
+        d = self.format_ident(store.ident[destination]) if destination >= 0 else self.empty
+        s = str(post.score) if post.score != 0 else ""
+        f = ""
+        if post.auxiliary == Post.Canon:
+            f = "+"
+        elif post.auxiliary == Post.Suppress:
+            f = "-"
+        a = post.author
+        t = str(post.timestamp) if post.timestamp is not None else ""
+
+        return p+self.arrow+self.format_ident(post.ident)+self.arrow+d+sep+post.text+sep+s+sep+f+sep+a+sep+t+sep
+
+    def decode_record(self, line):
+        parts = line.split(self.separator)
+        idents = parts[0].split(self.arrow)
+        if len(parts) < 6 or len(idents) != 3:
+            raise ValueError("Malformed record " + line.rstrip("\n")[:40])
+        parent = self.ident_number(idents[0]) if idents[0] != self.empty else None
+        destination = self.ident_number(idents[2]) if idents[2] != self.empty else None
+        score = 0 if parts[2] == "" else int(parts[2])
+        auxiliary = Post.Neutral
+        if parts[3] == "+":
+            auxiliary = Post.Canon
+        elif parts[3] == "-":
+            auxiliary = Post.Suppress
+        timestamp = None if parts[5] == "" else int(parts[5])
+        return PostRecord(parent, self.ident_number(idents[1]), destination, parts[1], score, auxiliary, parts[4],
+                          timestamp)
+
+    def format_ident(self, number):
+        return "X" + str(number)
+
+    def ident_number(self, ident):
+        if not ident.startswith("X") or not ident[1:].isdigit():
+            raise ValueError("Post ident " + ident + " is not of the form X<number>")
+        return int(ident[1:])
+
+    def is_binary(self, file):
+        try:
+            return file.peek(len(self.binary_magic))[:len(self.binary_magic)] == self.binary_magic
+        except self.stream_errors as e:
+            raise self.stream_error(e)
+
+    def read_all(self, file):
+        try:
+            return file.read()
+        except self.stream_errors as e:
+            raise self.stream_error(e)
+
+    @staticmethod
+    def stream_error(error):
+        return OSError("Corrupt compressed graph file (" + (str(error) or type(error).__name__) + ")")
+
+    @staticmethod
+    def compression(path):
+        for suffix in Model.compressed_magic:
+            if path.endswith(suffix):
+                return suffix
+        return None
+
+    def is_binary_path(self, path):
+        suffix = self.compression(path)
+        return (path[:-len(suffix)] if suffix is not None else path).endswith(self.binary_extension)
+
+    def decompress(self, raw):
+        head = raw.peek(8)
+        if head.startswith(self.compressed_magic[".gz"]):
+            return gzip.GzipFile(fileobj=raw, mode='rb')
+        if head.startswith(self.compressed_magic[".xz"]):
+            return lzma.LZMAFile(raw, 'rb')
+        return raw
+
+    def compress(self, raw, path):
+        suffix = self.compression(path)
+        if suffix == ".gz":
+            return gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6)
+        if suffix == ".xz":
+            return lzma.LZMAFile(raw, 'wb', preset=6)
+        return raw
+
+    def iter_records(self, file):
+        if self.is_binary(file):
+            yield from self.iter_binary_records(self.read_all(file))
+            return
+        try:
+            for line in file:
+                yield self.decode_record(line.decode("utf-8"))
+        except self.stream_errors as e:
+            raise self.stream_error(e)
+
+    @staticmethod
+    def little_endian(values):
+        if sys.byteorder != "little":
+            values = array(values.typecode, values)
+            values.byteswap()
+        return values.tobytes()
+
+    def encode_columns(self):
+        store = self.store
+        count = len(store)
+        texts = list(map(str.encode, store.texts))
+        names = list(map(str.encode, store.author_names))
+
+        text_offsets = array("Q", [0])
+        text_offsets.extend(accumulate(map(len, texts)))
+        name_offsets = array("Q", [0])
+        name_offsets.extend(accumulate(map(len, names)))
+
+        return [self.binary_header.pack(self.binary_magic, self.binary_version, count),
+                self.little_endian(store.ident), self.little_endian(store.parent),
+                self.little_endian(store.destination), self.little_endian(store.score),
+                self.little_endian(store.timestamp), self.little_endian(store.author), self.little_endian(text_offsets),
+                store.auxiliary.tobytes(), self.little_endian(array("Q", [len(names)])),
+                self.little_endian(name_offsets), b"".join(texts), b"".join(names)]
+
+    def decode_columns(self, data):
+        if len(data) < self.binary_header.size:
+            raise ValueError("Truncated binary graph file")
+        magic, version, count = self.binary_header.unpack_from(data)
+        if magic != self.binary_magic or version not in self.binary_columns:
+            raise ValueError("Unsupported binary graph file")
+        columns = {"count": count}
+        view = memoryview(data)
+        offset = self.read_columns(view, self.binary_header.size, self.binary_columns[version], count, columns)
+        if version == 1:
+            name_offsets = columns.pop("author_offsets")
+        else:
+            offset = self.read_columns(view, offset, [("name_offsets", "Q", 1)], columns["name_count"][0], columns)
+            name_offsets = columns.pop("name_offsets")
+        text_size = columns["text_offsets"][-1]
+        columns["text_blob"] = data[offset:offset + text_size]
+        offset += text_size
+        name_blob = data[offset:offset + name_offsets[-1]]
+        if len(columns["text_blob"]) != text_size or len(name_blob) != name_offsets[-1]:
+            raise ValueError("Truncated binary graph file")
+        names = list(map(bytes.decode, map(name_blob.__getitem__, map(slice, name_offsets[:-1], name_offsets[1:]))))
+        if version == 1:
+            self.upgrade_columns(columns, names)
+        else:
+            columns["author_names"] = names
+            if count > 0 and not 0 <= min(columns["author"]) <= max(columns["author"]) < len(names):
+                raise ValueError("Binary graph file has an author outside its name table")
+        self.check_rows(columns, count)
+        return columns
+
+    @staticmethod
+    def read_columns(view, offset, specs, count, columns):
+        for name, typecode, extra in specs:
+            length = count + extra if extra is not None else 1
+            values = array(typecode)
+            values.frombytes(view[offset:offset + length * values.itemsize])
+            if len(values) != length:
+                raise ValueError("Truncated binary graph file")
+            if sys.byteorder != "little":
+                values.byteswap()
+            columns[name] = values
+            offset += length * values.itemsize
+        return offset
+
+    @staticmethod
+    def upgrade_columns(columns, names):
+        columns["parent"] = array("i", columns["parent"])
+        columns["destination"] = array("i", columns["destination"])
+        ids = {}
+        columns["author"] = array("i", (ids.setdefault(name, len(ids)) for name in names))
+        columns["author_names"] = list(ids)
+
+    @staticmethod
+    def check_rows(columns, count):
+        if count == 0:
+            return
+        import numpy
+        rows = numpy.arange(count)
+        for name in ("parent", "destination"):
+            values = numpy.frombuffer(columns[name], dtype=columns[name].typecode)
+            bad = numpy.flatnonzero((values < -1) | (values >= rows))
+            if len(bad) > 0:
+                raise ValueError("Post row " + str(int(bad[0])) + " has a " + name + " that is not an earlier post")
+
+    def iter_binary_records(self, data):
+        columns = self.decode_columns(data)
+        idents = columns["ident"].tolist()
+        parents = columns["parent"].tolist()
+        destinations = columns["destination"].tolist()
+        scores = columns["score"].tolist()
+        timestamps = columns["timestamp"].tolist()
+        auxiliaries = columns["auxiliary"].tolist()
+        text_offsets = columns["text_offsets"].tolist()
+        text_blob = columns["text_blob"]
+        names = columns["author_names"]
+        authors = columns["author"].tolist()
+        for i in range(len(idents)):
+            yield PostRecord(idents[parents[i]] if parents[i] >= 0 else None, idents[i],
+                             idents[destinations[i]] if destinations[i] >= 0 else None,
+                             text_blob[text_offsets[i]:text_offsets[i+1]].decode("utf-8"), scores[i], auxiliaries[i],
+                             names[authors[i]],
+                             None if timestamps[i] == PostStore.NoTime else timestamps[i])
+
+    def add_record(self, record):
+        store = self.store
+        try:
+            parent = store.find(record.parent) if record.parent is not None else -1
+            destination = store.find(record.destination) if record.destination is not None else -1
+        except KeyError as e:
+            raise ValueError("Post " + self.format_ident(record.ident) + " refers to missing post " +
+                             self.format_ident(e.args[0]))
+        row = store.append(record.ident, parent, destination, record.text, record.score, record.auxiliary,
+                           record.author, record.timestamp)
+        self.version += 1
+        return store[row]
+
+    def add_columns(self, columns, start, stop):
+        self.store.extend_columns(columns, start, stop)
+        self.version += 1
+
+    def begin_load(self, path=None):
+        self.clear()
+        self.store.defer_formality = True
+        self.mark_synced(None)
+        if self.indexed and path is not None:
+            with instruments.span("search index"):
+                if self.search_index.read(path):
+                    self.index_count = self.search_index.indexed_count
+
+    def finish_load(self, path):
+        instruments.count("posts read", len(self.store))
+        with instruments.span("journal"):
+            self.replay_journal(path)
+        with instruments.span("formality"):
+            self.store.resolve_formality()
+        if self.indexed:
+            if self.index_count > len(self.store):
+                self.search_index = SearchIndex()
+                self.index_count = 0
+            if self.index_count != len(self.store):
+                self.write_search_index(path)
+        self.mark_synced(path)
+        self.version += 1
+
+    def copy(self):
+        copy = Model(indexed=False)
+        copy.begin_load()
+        for post in self.time_ordered:
+            parent = post.parent
+            destination = post.destination
+            copy.add_record(PostRecord(None if parent is None else parent.ident, post.ident,
+                                       None if destination is None else destination.ident, post.text, post.score,
+                                       post.auxiliary, post.author, post.timestamp))
+        copy.store.resolve_formality()
+        return copy
+
+    def read_from_file(self, path):
+        with instruments.operation("read"):
+            self.begin_load(path)
+            with open(path, 'rb') as raw, self.decompress(raw) as file:
+                if self.is_binary(file):
+                    columns = self.decode_columns(self.read_all(file))
+                    self.add_columns(columns, 0, columns["count"])
+                else:
+                    for record in self.iter_records(file):
+                        self.add_record(record)
+            self.finish_load(path)
+
+    def replay_journal(self, path):
+        journal_path = path + self.journal_suffix
+        if not os.path.exists(journal_path):
+            return
+        with open(journal_path, 'rb') as file:
+            if file.readline() != self.journal_header(path):
+                return
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break
+                line = line.decode("utf-8")
+                if line.startswith(self.score_mark):
+                    parts = line[len(self.score_mark):].split(self.separator)
+                    self.store[self.store.find(self.ident_number(parts[0]))].addScore(int(parts[1]))
+                else:
+                    self.add_record(self.decode_record(line))
+
+    def journal_header(self, path):
+        size, mtime = SearchIndex.stamp(path)
+        return (self.journal_mark + str(size) + self.separator + str(mtime) + self.separator + "\n").encode("utf-8")
+
+    def mark_synced(self, path):
+        self.synced_path = path
+        self.synced_count = len(self.time_ordered) if path is not None else 0
+        self.score_deltas = {}
+        self.base_bytes = os.path.getsize(path) if path is not None else 0
+        journal_path = "" if path is None else path + self.journal_suffix
+        self.journal_bytes = os.path.getsize(journal_path) if os.path.exists(journal_path) else 0
+
+    def needs_compaction(self):
+        return self.journal_bytes > self.base_bytes * self.journal_ratio
+
+    def save(self, path):
+        with instruments.operation("save"):
+            self.run_save(self.begin_save(path))
+
+    def write_to_file(self, path):
+        with instruments.operation("write"):
+            self.run_save(self.begin_save(path, full=True))
+            instruments.count("posts written", len(self.time_ordered))
+
+    def run_save(self, job):
+        job.run()
+        self.finish_save(job)
+        if job.error is not None:
+            raise job.error
+
+    def begin_save(self, path, full=None):
+        if full is None:
+            full = path != self.synced_path or self.needs_compaction()
+        job = SaveJob(self, path, full)
+        if full:
+            job.snapshot = Model(indexed=False)
+            job.snapshot.store = job.snapshot.time_ordered = self.store.snapshot()
+        else:
+            job.header = self.journal_header(path)
+            job.data = self.journal_lines(job.score_deltas)
+        self.score_deltas = {}
+        return job
+
+    def finish_save(self, job):
+        if job.error is not None:
+            for post, amt in job.score_deltas.items():
+                self.score_deltas[post] = self.score_deltas.get(post, 0) + amt
+            return False
+        if job.full:
+            self.synced_path = job.path
+            self.base_bytes = job.written
+            self.journal_bytes = 0
+            self.index_count = 0
+        else:
+            self.journal_bytes += job.written
+        self.synced_count = job.count
+        if self.indexed and len(self.store) == job.count and self.index_count != job.count:
+            self.write_search_index(job.path)
+        return True
+
+    def write_search_index(self, path):
+        with instruments.span("search index"):
+            self.index_posts()
+            try:
+                self.search_index.write(path)
+            except OSError:
+                return
+            self.index_count = self.search_index.indexed_count
+
+    def journal_lines(self, score_deltas):
+        lines = []
+        for post, amt in score_deltas.items():
+            if amt != 0 and post.row < self.synced_count:
+                lines.append(self.score_mark + self.format_ident(post.ident) + self.separator + str(amt) + self.separator + "\n")
+        for post in self.time_ordered[self.synced_count:]:
+            lines.append(self.encode_post(post) + "\n")
+        return "".join(lines).encode("utf-8")
+
+    def write_atomic(self, path):
+        temp_path = path + ".saving"
+        try:
+            with open(temp_path, 'wb') as raw:
+                if os.path.exists(path):
+                    shutil.copymode(path, temp_path)
+                self.write_stream(raw, path)
+                raw.flush()
+                os.fsync(raw.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self.sync_folder(path)
+
+    @staticmethod
+    def sync_folder(path):
+        try:
+            folder = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(folder)
+        except OSError:
+            pass
+        finally:
+            os.close(folder)
+
+    def write_stream(self, raw, path):
+        stream = self.compress(raw, path)
+        if self.is_binary_path(path):
+            for column in self.encode_columns():
+                stream.write(column)
+        else:
+            file = io.TextIOWrapper(stream, encoding="utf-8")
+            for post in self.time_ordered:
+                file.write(self.encode_post(post)+"\n")
+            file.flush()
+            file.detach()
+        if stream is not raw:
+            stream.close()
+
+    @staticmethod
+    def convert(src_path, dest_path):
+        model = Model(indexed=False)
+        model.read_from_file(src_path)
+        model.write_to_file(dest_path)
+
+
+class SaveJob:
+
+    def __init__(self, model, path, full):
+        self.path = path
+        self.full = full
+        self.count = len(model.store)
+        self.version = model.version
+        self.score_deltas = model.score_deltas
+        self.journal_path = path + model.journal_suffix
+        self.snapshot = None
+        self.header = b""
+        self.data = b""
+        self.written = 0
+        self.error = None
+
+    def run(self):
+        try:
+            if self.full:
+                self.snapshot.write_atomic(self.path)
+                if os.path.exists(self.journal_path):
+                    os.remove(self.journal_path)
+                self.written = os.path.getsize(self.path)
+            elif len(self.data) > 0:
+                data = self.data if self.journal_matches() else self.header + self.data
+                with open(self.journal_path, 'ab' if data is self.data else 'wb') as file:
+                    file.write(data)
+                    file.flush()
+                    os.fsync(file.fileno())
+                self.written = len(data)
+        except OSError as e:
+            self.error = e
+        self.snapshot = None
+
+    def journal_matches(self):
+        if not os.path.exists(self.journal_path):
+            return False
+        with open(self.journal_path, 'rb') as file:
+            return file.readline() == self.header
+
+
+class ModelLoader:
+
+    def __init__(self, model, path):
+        self.model = model
+        self.path = path
+        self.raw = open(path, 'rb')
+        self.file = model.decompress(self.raw)
+        self.columns = None
+        self.records = None
+        if model.is_binary(self.file):
+            self.columns = model.decode_columns(model.read_all(self.file))
+        else:
+            self.records = model.iter_records(self.file)
+        self.total_bytes = max(os.path.getsize(path), 1)
+        self.bytes_read = 0
+        self.done = False
+        self.cancelled = False
+        model.begin_load(path)
+
+    def load_chunk(self, size):
+        if self.done:
+            return 0
+        with instruments.span("load chunk"):
+            count, finished = self.load_records(size)
+            if self.model.indexed:
+                self.model.index_posts()
+        if finished:
+            self.close()
+            with instruments.operation("load"):
+                self.model.finish_load(self.path)
+            self.done = True
+        return count
+
+    def load_records(self, size):
+        if self.columns is not None:
+            start = len(self.model.time_ordered)
+            stop = min(start + size, self.columns["count"])
+            self.model.add_columns(self.columns, start, stop)
+            count = stop - start
+            finished = stop == self.columns["count"]
+            self.bytes_read = self.total_bytes * stop // max(self.columns["count"], 1)
+        else:
+            count = 0
+            finished = True
+            for record in self.records:
+                self.model.add_record(record)
+                count += 1
+                if count >= size:
+                    finished = False
+                    break
+            self.bytes_read = self.raw.tell()
+        return count, finished
+
+    def progress(self):
+        return 1 if self.done else self.bytes_read / self.total_bytes
+
+    def cancel(self):
+        self.cancelled = True
+        self.done = True
+        self.close()
+
+    def close(self):
+        self.bytes_read = self.total_bytes
+        if self.records is not None:
+            self.records.close()
+        self.columns = None
+        self.file.close()
+        self.raw.close()
+
+
@@ -0,0 +1,308 @@
+import argparse
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+
+from bugmodel import Model, Post, PostRecord
+
+Extensions = tuple(extension + suffix for extension in (".bug", Model.binary_extension)
+                   for suffix in [""] + list(Model.compressed_magic))
+MaxErrors = 20
+TopAuthors = 5
+
+
+def collect_paths(paths):
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for folder, _, names in os.walk(path):
+                found.extend(os.path.join(folder, name) for name in sorted(names) if name.endswith(Extensions))
+        else:
+            found.append(path)
+    return found
+
+
+def validate(path):
+    model = Model(indexed=False)
+    errors = []
+    error_count = 0
+    seen = set()
+    count = 0
+
+    def error(where, message):
+        nonlocal error_count
+        error_count += 1
+        if len(errors) < MaxErrors:
+            errors.append(where + ": " + message)
+
+    def check_ident(where, number, kind):
+        if number not in seen:
+            error(where, kind + " " + model.format_ident(number) + " does not refer to an earlier post")
+
+    with open(path, 'rb') as raw, model.decompress(raw) as file:
+        records = model.iter_records(file)
+        line = 0
+        while True:
+            line += 1
+            where = "record " + str(line)
+            try:
+                record = next(records)
+            except StopIteration:
+                break
+            except OSError as e:
+                error(where, "unreadable file (" + str(e) + ")")
+                break
+            except (ValueError, IndexError, UnicodeDecodeError) as e:
+                error(where, "unreadable record (" + str(e) + ")")
+                if model.is_binary(file):
+                    break
+                records = model.iter_records(file)
+                continue
+            count += 1
+            if record.parent is not None:
+                check_ident(where, record.parent, "parent")
+            if record.destination is not None:
+                check_ident(where, record.destination, "destination")
+            if record.ident in seen:
+                error(where, "duplicate post " + model.format_ident(record.ident))
+            seen.add(record.ident)
+            if record.auxiliary != Post.Neutral and record.parent is None:
+                error(where, "auxiliary post " + model.format_ident(record.ident) + " has no parent")
+
+    journal_path = path + model.journal_suffix
+    if os.path.exists(journal_path):
+        with open(journal_path, 'rb') as file:
+            if file.readline() != model.journal_header(path):
+                error("journal", "does not match its base file and will be ignored")
+            else:
+                for line, raw in enumerate(file, 2):
+                    where = "journal line " + str(line)
+                    if not raw.endswith(b"\n"):
+                        error(where, "torn final line")
+                        break
+                    try:
+                        text = raw.decode("utf-8")
+                        if text.startswith(model.score_mark):
+                            parts = text[len(model.score_mark):].split(model.separator)
+                            check_ident(where, model.ident_number(parts[0]), "scored post")
+                            int(parts[1])
+                        else:
+                            record = model.decode_record(text)
+                            if record.parent is not None:
+                                check_ident(where, record.parent, "parent")
+                            if record.destination is not None:
+                                check_ident(where, record.destination, "destination")
+                            seen.add(record.ident)
+                            count += 1
+                    except (ValueError, IndexError, UnicodeDecodeError) as e:
+                        error(where, "unreadable line (" + str(e) + ")")
+
+    if count == 0:
+        error(path, "no posts")
+    return {"path": path, "posts": count, "valid": error_count == 0, "error_count": error_count, "errors": errors}
+
+
+def depths(store):
+    count = len(store)
+    depth = [0] * count
+    for row, parent in enumerate(store.parent):
+        if parent >= 0:
+            depth[row] = depth[parent] + 1
+    return numpy.array(depth, dtype=numpy.int64)
+
+
+def stats(path):
+    model = Model(indexed=False)
+    model.read_from_file(path)
+    store = model.store
+    count = len(store)
+    depth = depths(store)
+    store.ensure_links()
+    fan_out = numpy.diff(store.child_offsets)
+    store.refresh_stale()
+    auxiliary = store.column("auxiliary")
+    formality = store.column("formality")
+    authors = numpy.array([len(rows) for rows in store.author_rows], dtype=numpy.int64)
+    top = numpy.argsort(-authors, kind="stable")[:TopAuthors]
+    return {"path": path, "posts": count,
+            "max_depth": int(depth.max()) if count > 0 else 0,
+            "mean_depth": round(float(depth.mean()), 3) if count > 0 else 0,
+            "max_fan_out": int(fan_out.max()) if count > 0 else 0,
+            "leaves": int((fan_out == 0).sum()),
+            "destinations": int((store.column("destination") >= 0).sum()),
+            "authors": int((authors > 0).sum()),
+            "top_authors": {store.author_names[i]: int(authors[i]) for i in top.tolist() if authors[i] > 0},
+            "canon_posts": int((auxiliary == Post.Canon).sum()),
+            "suppress_posts": int((auxiliary == Post.Suppress).sum()),
+            "canon_formal": int((formality == Post.Canon).sum()),
+            "suppress_formal": int((formality == Post.Suppress).sum())}
+
+
+def convert_target(path, extension, output):
+    folder = os.path.dirname(path) if output is None else output
+    name = os.path.basename(path)
+    suffix = Model.compression(name)
+    if suffix is not None:
+        name = name[:-len(suffix)]
+    return os.path.join(folder, os.path.splitext(name)[0] + extension)
+
+
+def plan_conversions(paths, extension, output, force):
+    targets = {path: convert_target(path, extension, output) for path in paths}
+    inputs = {os.path.abspath(path) for path in paths}
+    claimed = {}
+    for path, target in targets.items():
+        if os.path.abspath(target) != os.path.abspath(path):
+            claimed.setdefault(os.path.abspath(target), []).append(path)
+    failures = {}
+    for path, target in targets.items():
+        key = os.path.abspath(target)
+        if key == os.path.abspath(path):
+            continue
+        if len(claimed[key]) > 1:
+            failures[path] = "output " + target + " would also be written from " + \
+                             ", ".join(other for other in claimed[key] if other != path)
+        elif key in inputs:
+            failures[path] = "output " + target + " is another input file"
+        elif os.path.exists(target) and not force:
+            failures[path] = "output " + target + " already exists (use --force to overwrite)"
+    return targets, failures
+
+
+def convert(path, targets):
+    target = targets[path]
+    if os.path.abspath(target) == os.path.abspath(path):
+        return {"path": path, "output": target, "skipped": True}
+    Model.convert(path, target)
+    return {"path": path, "output": target, "bytes_in": os.path.getsize(path), "bytes_out": os.path.getsize(target)}
+
+
+def extract(path, ident, output, max_depth=None, force=False):
+    if os.path.abspath(output) == os.path.abspath(path):
+        raise ValueError("output " + output + " is the input file")
+    if os.path.exists(output) and not force:
+        raise ValueError("output " + output + " already exists (use --force to overwrite)")
+    model = Model(indexed=False)
+    model.read_from_file(path)
+    store = model.store
+    try:
+        root = store.find(model.ident_number(ident))
+    except KeyError:
+        raise ValueError("Post " + ident + " is not in " + path)
+
+    rows = [root]
+    queue = deque([(root, 0)])
+    while len(queue) > 0:
+        row, depth = queue.popleft()
+        if max_depth is not None and depth >= max_depth:
+            continue
+        for child in store.children_of(row).tolist():
+            rows.append(child)
+            queue.append((child, depth + 1))
+    rows.sort()
+
+    renumbered = {row: i for i, row in enumerate(rows)}
+    extracted = Model(indexed=False)
+    extracted.begin_load()
+    for row in rows:
+        post = store[row]
+        parent = renumbered.get(store.parent[row])
+        destination = renumbered.get(store.destination[row])
+        timestamp = store.timestamp[row]
+        extracted.add_record(PostRecord(parent, renumbered[row], destination, post.text, post.score, post.auxiliary,
+                                        post.author, None if timestamp == store.NoTime else timestamp))
+    extracted.store.link_rows()
+    extracted.store.resolve_formality()
+    extracted.write_to_file(output)
+    return {"path": path, "output": output, "posts": len(rows)}
+
+
+def run_all(task, paths, jobs, *args):
+    if jobs == 1 or len(paths) <= 1:
+        for path in paths:
+            yield run_one(task, path, *args)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(run_one, task, path, *args) for path in paths]
+        for future in futures:
+            yield future.result()
+
+
+def run_one(task, path, *args):
+    try:
+        return task(path, *args)
+    except (OSError, ValueError) as e:
+        return {"path": path, "failed": str(e)}
+
+
+def report(result, as_json):
+    if as_json:
+        print(json.dumps(result))
+        return
+    if "failed" in result:
+        print(result["path"] + ": FAILED " + result["failed"])
+    elif "valid" in result:
+        print(result["path"] + ": " + ("ok" if result["valid"] else str(result["error_count"]) + " errors") +
+              " (" + str(result["posts"]) + " posts)")
+        for message in result["errors"]:
+            print("    " + message)
+    else:
+        print(result["path"] + ": " + ", ".join(key + "=" + str(value) for key, value in result.items()
+                                                 if key != "path"))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Headless tools for brainstormer graph files.")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("validate", help="check files for malformed or dangling records")
+    command.add_argument("paths", nargs="+")
+    command = commands.add_parser("stats", help="print post, depth, fan-out, author and formality counts")
+    command.add_argument("paths", nargs="+")
+    command = commands.add_parser("convert", help="rewrite files as text or compact binary, optionally compressed")
+    command.add_argument("--to", choices=["bug", "bugc"], required=True)
+    command.add_argument("--compress", choices=["gz", "xz"], help="compress the converted files")
+    command.add_argument("--output", help="folder for converted files (default: next to each input)")
+    command.add_argument("--force", action="store_true", help="overwrite existing output files")
+    command.add_argument("paths", nargs="+")
+    command = commands.add_parser("extract", help="write the subtree under one post to a new file")
+    command.add_argument("path")
+    command.add_argument("ident")
+    command.add_argument("output")
+    command.add_argument("--depth", type=int, help="maximum depth below the root")
+    command.add_argument("--force", action="store_true", help="overwrite an existing output file")
+    args = parser.parse_args(argv)
+
+    if args.command == "extract":
+        results = [run_one(extract, args.path, args.ident, args.output, args.depth, args.force)]
+    else:
+        paths = collect_paths(args.paths)
+        if args.command == "validate":
+            results = run_all(validate, paths, args.jobs)
+        elif args.command == "stats":
+            results = run_all(stats, paths, args.jobs)
+        else:
+            if args.output is not None:
+                os.makedirs(args.output, exist_ok=True)
+            extension = "." + args.to + ("." + args.compress if args.compress is not None else "")
+            targets, failures = plan_conversions(paths, extension, args.output, args.force)
+            converted = run_all(convert, [path for path in paths if path not in failures], args.jobs, targets)
+            results = [{"path": path, "failed": failures[path]} if path in failures else next(converted)
+                       for path in paths]
+
+    status = 0
+    for result in results:
+        report(result, args.json)
+        if "failed" in result or not result.get("valid", True):
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -2,17 +2,14 @@ import sys
 
 import networkx as nx
 import gravis as gv
-import brainstormer_p2
+import bugmodel
 
 
-if __name__ == '__main__':
-
+def build_graph(model):
     g = nx.DiGraph()
     g.graph['node_label_size'] = 6
     g.graph['node_label_color'] = 'grey'
     colors = ['red', 'grey', 'green']
-    model = brainstormer_p2.Model()
-    model.read_from_file(sys.argv[1])
 
     for post in model.time_ordered:
         label = post.text if len(post.text) <= 30 else post.text[:27] + "..."
@@ -25,6 +22,13 @@ if __name__ == '__main__':
             g.add_edge(post.parent.ident, post.ident, color='black')
         if post.destination is not None:
             g.add_edge(post.ident, post.destination.ident, color='magenta')
+    return g
+
+
+if __name__ == '__main__':
+
+    model = bugmodel.Model(indexed=False)
+    model.read_from_file(sys.argv[1])
 
-    fig = gv.d3(g, node_label_data_source='label')
+    fig = gv.d3(build_graph(model), node_label_data_source='label')
     fig.display()
@@ -0,0 +1,118 @@
+import json
+import threading
+import time
+
+
+class NullSpan:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class Span:
+    __slots__ = ("owner", "name", "start")
+
+    def __init__(self, owner, name):
+        self.owner = owner
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.owner.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Operation(Span):
+    __slots__ = ()
+
+    def __enter__(self):
+        self.owner.depth += 1
+        return Span.__enter__(self)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        Span.__exit__(self, exc_type, exc_value, traceback)
+        self.owner.depth -= 1
+        if self.owner.depth == 0:
+            self.owner.emit(self.name)
+        return False
+
+
+class Instruments:
+    Null = NullSpan()
+    ReadoutSpans = 4
+
+    def __init__(self):
+        self.enabled = False
+        self.thread = threading.get_ident()
+        self.trace_path = None
+        self.depth = 0
+        self.times = {}
+        self.counters = {}
+        self.listeners = []
+        self.last_record = None
+
+    def enable(self, trace_path=None):
+        self.enabled = True
+        self.trace_path = trace_path
+        self.reset()
+
+    def disable(self):
+        self.enabled = False
+        self.trace_path = None
+        self.reset()
+
+    def reset(self):
+        self.depth = 0
+        self.times = {}
+        self.counters = {}
+
+    def recording(self):
+        return self.enabled and threading.get_ident() == self.thread
+
+    def span(self, name):
+        return Span(self, name) if self.recording() else Instruments.Null
+
+    def operation(self, name):
+        return Operation(self, name) if self.recording() else Instruments.Null
+
+    def add_time(self, name, seconds):
+        if self.recording():
+            self.times[name] = self.times.get(name, 0.0) + seconds
+
+    def count(self, name, amount=1):
+        if self.recording():
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def emit(self, name):
+        record = {"operation": name, "time": time.time(),
+                  "spans": {key: round(value * 1000, 3) for key, value in self.times.items()},
+                  "counters": self.counters}
+        self.times = {}
+        self.counters = {}
+        self.last_record = record
+        if self.trace_path is not None:
+            with open(self.trace_path, 'a', encoding="utf-8") as file:
+                file.write(json.dumps(record) + "\n")
+        for listener in self.listeners:
+            listener(record)
+
+    @staticmethod
+    def readout(record):
+        spans = record["spans"]
+        text = record["operation"] + " %.1f ms" % spans.get(record["operation"], 0)
+        inner = sorted((key for key in spans if key != record["operation"]), key=lambda key: -spans[key])
+        for key in inner[:Instruments.ReadoutSpans]:
+            text += " | " + key + " %.1f ms" % spans[key]
+        for key, value in record["counters"].items():
+            text += " | " + key + " " + str(value)
+        return text
+
+
+instruments = Instruments()
@@ -0,0 +1,92 @@
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bugmodel import Model, Post
+
+Seeds = range(8)
+PostCount = 600
+
+
+def sign(value):
+    return (value > 0) - (value < 0)
+
+
+class ReferencePost:
+    # The recursive formality propagation that PostStore replaced, kept as the expected behaviour.
+
+    def __init__(self, parent, auxiliary):
+        self.parent = parent
+        self.auxiliary = auxiliary
+        self.canon_score = 0
+        self.suppress_score = 0
+        if parent is not None and auxiliary != Post.Neutral:
+            self.suppress_score = -1
+            parent.auxFormalityChanged(self, True)
+
+    def formality(self):
+        return sign(sign(self.canon_score) - sign(self.suppress_score))
+
+    def auxFormalityChanged(self, aux, is_upgrade):
+        pre_type = self.formality()
+        amt = 1 if is_upgrade else -1
+
+        if aux.auxiliary == Post.Canon:
+            self.canon_score += amt
+        elif aux.auxiliary == Post.Suppress:
+            self.suppress_score += amt
+
+        post_type = self.formality()
+        if self.auxiliary != Post.Neutral and self.parent is not None:
+            if pre_type != Post.Canon and post_type == Post.Canon:
+                self.parent.auxFormalityChanged(self, True)
+            elif pre_type == Post.Canon and post_type != Post.Canon:
+                self.parent.auxFormalityChanged(self, False)
+
+
+def build(seed):
+    rand = random.Random(seed)
+    model = Model(indexed=False)
+    model.new_model("root")
+    reference = [ReferencePost(None, Post.Neutral)]
+    for i in range(1, PostCount):
+        row = rand.randrange(i) if rand.random() < 0.5 else max(0, i - 1 - rand.randrange(min(i, 8)))
+        auxiliary = rand.choice([Post.Neutral, Post.Canon, Post.Canon, Post.Suppress])
+        model.add_post(model.store[row], None, "post " + str(i), auxiliary=auxiliary)
+        reference.append(ReferencePost(reference[row], auxiliary))
+    return model, reference
+
+
+class FormalityTest(unittest.TestCase):
+
+    def assertMatches(self, model, reference):
+        self.assertEqual(len(model.store), len(reference))
+        for post, expected in zip(model.store, reference):
+            self.assertEqual((post.canon_score, post.suppress_score, post.formality()),
+                             (expected.canon_score, expected.suppress_score, expected.formality()),
+                             "post " + str(post.ident))
+
+    def test_add_post_matches_recursive(self):
+        for seed in Seeds:
+            with self.subTest(seed=seed):
+                self.assertMatches(*build(seed))
+
+    def test_read_from_file_matches_recursive(self):
+        with tempfile.TemporaryDirectory() as folder:
+            for seed in Seeds:
+                model, reference = build(seed)
+                for extension in (".bug", Model.binary_extension):
+                    with self.subTest(seed=seed, extension=extension):
+                        path = os.path.join(folder, str(seed) + extension)
+                        model.write_to_file(path)
+                        loaded = Model(indexed=False)
+                        loaded.read_from_file(path)
+                        self.assertMatches(loaded, reference)
+
+
+if __name__ == '__main__':
+    unittest.main()